@@ -3,18 +3,34 @@
 #----------------------------------------------------------------------------#
 
 import json
+import base64
 import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify, abort
+import babel.dates
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify, abort, session, make_response, stream_with_context, get_flashed_messages, g
 from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from forms import *
+from search import setupSearch, searchByName
+from serializers import jsonResponse, parseFields
+from cache import ReferenceCache, PageCache
+from importer import importFile, parseBoolean, parseList
+from generator import DataGenerator
+from instrumentation import QueryInstrumentation
+from pooling import poolStats
+from routing import RoutingSQLAlchemy, readOnly, STICKY_COOKIE
 from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 import datetime
 import itertools
+import click
+import functools
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
@@ -22,8 +38,16 @@ import itertools
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+db = RoutingSQLAlchemy(app)
 migrate = Migrate(app, db)
+instrumentation = QueryInstrumentation(app)
+
+
+@event.listens_for(Engine, 'connect')
+def enableSqliteForeignKeys(dbapi_connection, connection_record):
+    # SQLite only honours ON DELETE CASCADE with foreign keys switched on
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.execute('PRAGMA foreign_keys=ON')
 
 # TODO: connect to a local postgresql database
 
@@ -33,16 +57,18 @@ migrate = Migrate(app, db)
 
 VenueGenres = db.Table('venue_genres',
                        db.Column('venue_id', db.Integer,
-                                 db.ForeignKey('venues.id')),
+                                 db.ForeignKey('venues.id', ondelete='CASCADE')),
                        db.Column('genre_id', db.Integer,
-                                 db.ForeignKey('genres.id'))
+                                 db.ForeignKey('genres.id'), index=True),
+                       db.UniqueConstraint('venue_id', 'genre_id')
                        )
 
 ArtistGenres = db.Table('artist_genres',
                         db.Column('artist_id', db.Integer,
-                                  db.ForeignKey('artists.id')),
+                                  db.ForeignKey('artists.id', ondelete='CASCADE')),
                         db.Column('genre_id', db.Integer,
-                                  db.ForeignKey('genres.id'))
+                                  db.ForeignKey('genres.id'), index=True),
+                        db.UniqueConstraint('artist_id', 'genre_id')
                         )
 
 
@@ -50,7 +76,7 @@ class Genres(db.Model):
     __tablename__ = 'genres'
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(120))
+    name = db.Column(db.String(120), unique=True)
 
     def __repr__(self):
         return self.name
@@ -58,10 +84,11 @@ class Genres(db.Model):
 
 class City(db.Model):
     __tablename__ = 'cities'
+    __table_args__ = (db.UniqueConstraint('name', 'state_id'),)
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
-    state_id = db.Column(db.Integer, db.ForeignKey('states.id'))
+    state_id = db.Column(db.Integer, db.ForeignKey('states.id'), index=True)
     venues = db.relationship("Venue", backref='city', lazy=True)
     artists = db.relationship("Artist", backref='city', lazy=True)
 
@@ -73,7 +100,7 @@ class State(db.Model):
     __tablename__ = 'states'
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(120), nullable=False)
+    name = db.Column(db.String(120), nullable=False, unique=True)
     cities = db.relationship("City", backref='state', lazy=True)
 
     def __repr__(self):
@@ -82,6 +109,7 @@ class State(db.Model):
 
 class Venue(db.Model):
     __tablename__ = 'venues'
+    __table_args__ = (db.Index('ix_venues_name_id', 'name', 'id'),)
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -92,8 +120,13 @@ class Venue(db.Model):
     seeking_description = db.Column(db.String)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
-    shows = db.relationship("Show", backref='venue', lazy=True)
-    city_id = db.Column(db.Integer, db.ForeignKey('cities.id'))
+    deleted_at = db.Column(db.DateTime)
+    upcoming_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    shows = db.relationship("Show", backref='venue', lazy=True, passive_deletes=True)
+    city_id = db.Column(db.Integer, db.ForeignKey('cities.id'), index=True)
     genres = db.relationship(
         'Genres', secondary=VenueGenres, backref='venues', lazy=True)
 
@@ -103,6 +136,7 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'artists'
+    __table_args__ = (db.Index('ix_artists_name_id', 'name', 'id'),)
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -112,8 +146,13 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String)
     website = db.Column(db.String(120))
-    shows = db.relationship("Show", backref='artist', lazy=True)
-    city_id = db.Column(db.Integer, db.ForeignKey('cities.id'))
+    deleted_at = db.Column(db.DateTime)
+    upcoming_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    shows = db.relationship("Show", backref='artist', lazy=True, passive_deletes=True)
+    city_id = db.Column(db.Integer, db.ForeignKey('cities.id'), index=True)
     genres = db.relationship(
         'Genres', secondary=ArtistGenres, backref='artists', lazy=True)
 
@@ -121,31 +160,125 @@ class Artist(db.Model):
         return "<Artist(name='%s')>" % self.name
 
 
+setupSearch(Venue)
+setupSearch(Artist)
+
+
 class Show(db.Model):
     __tablename__ = 'shows'
+    __table_args__ = (
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_shows_start_time_id', 'start_time', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime(), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey(
-        'venues.id'), nullable=False)
+        'venues.id', ondelete='CASCADE'), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey(
-        'artists.id'), nullable=False)
+        'artists.id', ondelete='CASCADE'), nullable=False)
 
     def __repr__(self):
         return "<Show (start_time='%s')>" % format_datetime(self.start_time)
 
+
+class ShowCounterRollup(db.Model):
+    """When the show counters last moved started shows to the past"""
+    __tablename__ = 'show_counter_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    rolled_at = db.Column(db.DateTime, nullable=False)
+
+
+def refreshShowCounters(connection, venue_ids=(), artist_ids=(), now=None):
+    """Recounts the upcoming and past shows of the given venues and artists
+
+    One correlated UPDATE per side over the (owner, start_time) indexes, so
+    the listings read their counts straight off the row. Pass `None` as
+    ids to recount every row.
+    """
+    now = now or datetime.datetime.now()
+    for model, owner, ids in ((Venue, Show.venue_id, venue_ids),
+                              (Artist, Show.artist_id, artist_ids)):
+        if ids is not None:
+            ids = {int(id) for id in ids}
+            if not ids:
+                continue
+
+        def count(*criteria):
+            return db.select([db.func.count(Show.id)]) \
+                .where(db.and_(owner == model.id, *criteria)).scalar_subquery()
+
+        statement = model.__table__.update().values(
+            upcoming_shows_count=count(Show.start_time >= now),
+            past_shows_count=count(Show.start_time < now))
+        if ids is not None:
+            statement = statement.where(model.id.in_(ids))
+        connection.execute(statement)
+
+
+@event.listens_for(Show, 'after_insert')
+@event.listens_for(Show, 'after_delete')
+def countShow(mapper, connection, show):
+    refreshShowCounters(connection, [show.venue_id], [show.artist_id])
+
+
+@event.listens_for(Show, 'after_update')
+def recountShow(mapper, connection, show):
+    venue_ids, artist_ids = [show.venue_id], [show.artist_id]
+    for key, ids in (('venue_id', venue_ids), ('artist_id', artist_ids)):
+        ids.extend(db.inspect(show).attrs[key].history.deleted)
+    refreshShowCounters(connection, venue_ids, artist_ids)
+
+
+def rollShowCounters(now=None, rebuild=False):
+    """Moves the shows that started since the last run from upcoming to past
+
+    Only the venues and artists with such shows are recounted. The first
+    run, or `rebuild`, recounts every row.
+    """
+    now = now or datetime.datetime.now()
+    rollup = ShowCounterRollup.query.get(1)
+    if rollup is None or rebuild:
+        venue_ids = artist_ids = None
+    else:
+        started = db.session.query(Show).filter(
+            Show.start_time >= rollup.rolled_at, Show.start_time < now)
+        venue_ids = [id for id, in started.with_entities(Show.venue_id).distinct()]
+        artist_ids = [id for id, in started.with_entities(Show.artist_id).distinct()]
+    refreshShowCounters(db.session, venue_ids, artist_ids, now)
+    if rollup is None:
+        rollup = ShowCounterRollup(id=1, rolled_at=now)
+        db.session.add(rollup)
+    rollup.rolled_at = now
+    db.session.commit()
+    return venue_ids, artist_ids
+
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma"
+}
+
+
+@functools.lru_cache(maxsize=None)
+def datetimePattern(format, locale):
+    """Babel pattern and locale for a filter format, compiled once"""
+    return (babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)),
+            babel.Locale.parse(locale or babel.dates.LC_TIME))
+
+
+def format_datetime(value, format='medium', locale=None):
+    """Formats a show time; takes datetimes as-is, parses strings"""
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    pattern, locale = datetimePattern(format, locale)
+    return pattern.apply(value, locale)
 
 
 app.jinja_env.filters['datetime'] = format_datetime
@@ -163,148 +296,330 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-def getVenueUpcomingShows(venue):
-    upcoming_shows = []
-    shows = Show.query.filter(Show.venue_id == venue.id).all()
-    now = datetime.datetime.now().replace(microsecond=0)
+SHOWS_PER_PARTITION = 50
 
-    for show in shows:
-        if show.start_time >= now:
-            upcoming_shows.append(
-                {
-                    'artist_id': show.artist.id,
-                    'artist_name': show.artist.name,
-                    'artist_image_link': show.artist.image_link,
-                    'start_time': show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-                }
-            )
-    return upcoming_shows
-
-
-def getVenuePastShows(venue):
-    past_shows = []
-    shows = Show.query.filter(Show.venue_id == venue.id).all()
-    now = datetime.datetime.now().replace(microsecond=0)
 
-    for show in shows:
-        if show.start_time < now:
-            past_shows.append(
-                {
-                    'artist_id': show.artist.id,
-                    'artist_name': show.artist.name,
-                    'artist_image_link': show.artist.image_link,
-                    'start_time': show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-                }
-            )
-    return past_shows
-
-
-def getArtistUpcomingShows(artist):
-    upcoming_shows = []
-    shows = Show.query.filter(Show.artist_id == artist.id).all()
-    now = datetime.datetime.now().replace(microsecond=0)
+def getShowTimeline(model, entity_id, limit=SHOWS_PER_PARTITION):
+    """Returns upcoming and past shows of a venue or an artist
 
-    for show in shows:
-        if show.start_time >= now:
-            upcoming_shows.append(
-                {
-                    'venue_id': show.venue.id,
-                    'venue_name': show.venue.name,
-                    'venue_image_link': show.venue.image_link,
-                    'start_time': show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-                }
-            )
-    return upcoming_shows
-
-
-def getArtistPastShows(artist):
-    past_shows = []
-    shows = Show.query.filter(Show.artist_id == artist.id).all()
+    Both partitions come from one query joined with the other side of the
+    show (the artist for a venue, the venue for an artist). Upcoming shows
+    are ordered soonest first, past shows latest first, and each partition
+    is cut to `limit` rows while still reporting its full count.
+    """
+    if model is Venue:
+        owner_id, counterpart, counterpart_id = Show.venue_id, Artist, Show.artist_id
+    else:
+        owner_id, counterpart, counterpart_id = Show.artist_id, Venue, Show.venue_id
+    prefix = counterpart.__tablename__[:-1]
     now = datetime.datetime.now().replace(microsecond=0)
+    upcoming = db.case([(Show.start_time >= now, 1)], else_=0)
+
+    timeline = db.session.query(
+        Show.start_time.label('start_time'),
+        counterpart.id.label('id'),
+        counterpart.name.label('name'),
+        counterpart.image_link.label('image_link'),
+        upcoming.label('upcoming'),
+        db.func.row_number().over(
+            partition_by=upcoming,
+            order_by=(db.case([(Show.start_time >= now, Show.start_time)]),
+                      Show.start_time.desc())
+        ).label('position'),
+        db.func.count(Show.id).over(partition_by=upcoming).label('total')
+    ).join(counterpart, db.and_(counterpart.id == counterpart_id,
+                                counterpart.deleted_at.is_(None))) \
+        .filter(owner_id == entity_id).subquery()
+
+    rows = db.session.query(timeline) \
+        .filter(timeline.c.position <= limit) \
+        .order_by(timeline.c.upcoming.desc(), timeline.c.position).all()
+
+    data = {
+        'upcoming_shows': [],
+        'upcoming_shows_count': 0,
+        'past_shows': [],
+        'past_shows_count': 0
+    }
+    for row in rows:
+        partition = 'upcoming_shows' if row.upcoming else 'past_shows'
+        data[partition].append({
+            prefix + '_id': row.id,
+            prefix + '_name': row.name,
+            prefix + '_image_link': row.image_link,
+            'start_time': row.start_time
+        })
+        data[partition + '_count'] = row.total
+    return data
+
+
+STREAM_BATCH_SIZE = 500
+STREAM_BUFFER_SIZE = 20
+
+
+def streamRows(statement):
+    """Executes `statement` on a server-side cursor
+
+    Rows are fetched in batches as they are read. The cursor is closed
+    when the request ends, even if the response is dropped half-sent.
+    """
+    result = db.session.execute(statement.execution_options(
+        stream_results=True, max_row_buffer=STREAM_BATCH_SIZE))
+    g.setdefault('streamed_results', []).append(result)
+    return result
 
-    for show in shows:
-        if show.start_time < now:
-            past_shows.append(
-                {
-                    'venue_id': show.venue.id,
-                    'venue_name': show.venue.name,
-                    'venue_image_link': show.venue.image_link,
-                    'start_time': show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-                }
-            )
-    return past_shows
+
+@app.teardown_request
+def closeStreamedRows(error):
+    for result in g.pop('streamed_results', []):
+        result.close()
+
+
+def streamTemplate(template_name, **context):
+    """Renders a template to the client chunk by chunk
+
+    Pass iterators over server-side cursors in `context` and the page is
+    sent as the rows are read, so long listings start painting at once
+    and never sit whole in memory. Flashed messages are taken off the
+    session up front, while the session cookie can still be saved.
+    """
+    get_flashed_messages()
+    template = app.jinja_env.get_template(template_name)
+    app.update_template_context(context)
+    stream = template.stream(**context)
+    stream.enable_buffering(STREAM_BUFFER_SIZE)
+    return Response(stream_with_context(stream))
+
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encodeCursor(values):
+    values = [value.isoformat() if isinstance(value, datetime.datetime) else value
+              for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decodeCursor(cursor, columns):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(columns):
+            raise ValueError('Cursor does not match the page ordering.')
+        return [datetime.datetime.fromisoformat(value)
+                if column.type.python_type is datetime.datetime else value
+                for column, value in zip(columns, values)]
+    except (ValueError, TypeError):
+        abort(400)
+
+
+def getKeysetPage(query, columns, cursor=None, limit=PAGE_SIZE):
+    """Returns one page of `query` ordered by `columns` and the next cursor
+
+    The last column must be unique so the ordering is stable, and the query
+    must select every column under its own key so the cursor can be read
+    back from the last row.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if cursor:
+        values = decodeCursor(cursor, columns)
+        # a row-value comparison, which SQLite and PostgreSQL both turn into
+        # an index range starting at the cursor; the equivalent OR chain
+        # walks the index from its first entry
+        query = query.filter(db.tuple_(*columns) > db.tuple_(*values))
+
+    rows = query.order_by(*columns).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encodeCursor(
+            [getattr(rows[-1], column.key) for column in columns])
+    return rows, next_cursor
+
+
+referenceCache = ReferenceCache()
+referenceCache.watch(State)
+referenceCache.watch(City)
+referenceCache.watch(Genres)
+pageCache = PageCache(app.config['PAGE_CACHE_SIZE'], app.config['PAGE_CACHE_TTL'])
+
+
+def cachedPage(kind):
+    """Serves a detail page from the page cache, keyed by `<kind>_id`
+
+    Responses carry an ETag and Last-Modified so clients can revalidate
+    with a body-less 304. Pages are not cached while flash messages are
+    pending, since the layout renders them, nor for clients that just
+    wrote and read from the primary.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(**kwargs):
+            if '_flashes' in session or STICKY_COOKIE in request.cookies:
+                return view(**kwargs)
+            key = (kind, kwargs[kind + '_id'])
+            page = pageCache.get(key)
+            if page is None:
+                page = pageCache.put(key, view(**kwargs))
+            response = make_response(page.body)
+            response.set_etag(page.etag)
+            response.last_modified = page.last_modified
+            response.cache_control.no_cache = True
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+
+def invalidatePages(venue_ids=(), artist_ids=()):
+    pageCache.invalidate(*[('venue', int(id)) for id in venue_ids],
+                         *[('artist', int(id)) for id in artist_ids])
+
+
+def showCounterparts(column, counterpart, entity_id):
+    """Ids on the other side of an entity's shows, whose pages list it"""
+    return [id for id, in db.session.query(counterpart).filter(
+        column == entity_id).distinct()]
+
+
+def insertMissing(model, rows, keys):
+    """Inserts lookup rows, skipping the ones that already exist
+
+    Relies on the unique index over `keys` (INSERT ... ON CONFLICT DO
+    NOTHING), so concurrent requests resolving the same name wait on each
+    other instead of creating duplicates.
+    """
+    dialect = db.session.connection().dialect.name
+    if dialect == 'postgresql':
+        statement = postgresql.insert(model.__table__)
+    elif dialect == 'sqlite':
+        statement = sqlite.insert(model.__table__)
+    else:
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(model.__table__.insert().values(**row))
+            except IntegrityError:
+                pass
+        return
+    db.session.execute(
+        statement.values(rows).on_conflict_do_nothing(index_elements=keys))
 
 
 def getOrInsertState(value):
-    state_exist = State.query.filter(
-        State.name == value).first()
-    state = state_exist if state_exist is not None else State(
-        name=value)
+    state = referenceCache.get(db.session, State, value)
+    if state is None:
+        state = State.query.filter(State.name == value).first()
+        if state is None:
+            insertMissing(State, [{'name': value}], ['name'])
+            return State.query.filter(State.name == value).one()
+        referenceCache.put(value, state)
     return state
 
 
 def getOrInsertCity(value, state):
-    city_exist = City.query.filter(
-        City.name == value, City.state_id == state.id).first()
-    city = city_exist if city_exist is not None else City(
-        name=value, state=state)
+    city = referenceCache.get(db.session, City, (value, state.id))
+    if city is None:
+        query = City.query.filter(City.name == value, City.state_id == state.id)
+        city = query.first()
+        if city is None:
+            insertMissing(City, [{'name': value, 'state_id': state.id}],
+                          ['name', 'state_id'])
+            return query.one()
+        referenceCache.put((value, state.id), city)
     return city
 
 
 def getOrInsertGenres(values):
-    genres = []
+    genres = {}
+    missing = []
     for item in values:
-        genres_exist = Genres.query.filter(Genres.name == item).first()
-        genres.append(
-            genres_exist if genres_exist is not None else Genres(name=item))
-    return genres
+        genre = referenceCache.get(db.session, Genres, item)
+        if genre is None:
+            missing.append(item)
+        else:
+            genres[item] = genre
+
+    if missing:
+        for genre in Genres.query.filter(Genres.name.in_(missing)).all():
+            referenceCache.put(genre.name, genre)
+            genres[genre.name] = genre
+
+        new = [item for item in dict.fromkeys(missing) if item not in genres]
+        if new:
+            insertMissing(Genres, [{'name': item} for item in new], ['name'])
+            for genre in Genres.query.filter(Genres.name.in_(new)).all():
+                genres[genre.name] = genre
+
+    return [genres[item] for item in values]
+
+
+def groupVenuesByArea(rows):
+    """Groups (city, state, venue) rows into areas as they are read"""
+    for (city_id, city, state), items in itertools.groupby(rows, key=lambda row: row[:3]):
+        yield {
+            'city': city,
+            'state': state,
+            'venues': [
+                {
+                    'id': venue_id,
+                    'name': venue_name,
+                    'upcoming_shows_count': upcoming_shows_count
+                } for _, _, _, venue_id, venue_name, upcoming_shows_count in items
+                if venue_id is not None
+            ]
+        }
+
+
+def getVenuesByArea(stream=False):
+    """Builds the city -> venues -> upcoming_shows_count tree in one query
+
+    With `stream` the rows are read from a server-side cursor and the
+    areas are yielded one at a time instead of returned as a list.
+    """
+    query = db.session.query(
+        City.id, City.name, State.name, Venue.id, Venue.name,
+        Venue.upcoming_shows_count
+    ).outerjoin(State, City.state_id == State.id) \
+        .outerjoin(Venue, db.and_(Venue.city_id == City.id,
+                                  Venue.deleted_at.is_(None))) \
+        .order_by(City.id, Venue.id)
+
+    if stream:
+        return groupVenuesByArea(streamRows(query.statement))
+    return list(groupVenuesByArea(query.all()))
 
 
 @app.route('/venues')
+@readOnly
 def venues():
-    data = []
-    for item in City.query.all():
-        venues = item.venues
-        for venue in venues:
-            venue.upcoming_shows_count = len(getVenueUpcomingShows(venue))
-
-        data.append({
-            'city': item.name,
-            'state': item.state,
-            'venues': venues
-        })
-
-    return render_template('pages/venues.html', areas=data)
+    return streamTemplate('pages/venues.html', areas=getVenuesByArea(stream=True))
 
 
 @app.route('/venues/search', methods=['POST'])
+@readOnly
 def search_venues():
     search_term = request.form.get('search_term', '')
-    query = Venue.query.filter(Venue.name.ilike(f'%{search_term}%'))
-    response = {
-        "count": query.count(),
-        "data": query.all()
-    }
-    return render_template('pages/search_venues.html', results=response, search_term=search_term)
+    response = searchByName(db.session, Venue, search_term,
+                            app.config['SEARCH_PAGE_LIMIT'], streamRows)
+    return streamTemplate('pages/search_venues.html', results=response, search_term=search_term)
 
 
 @app.route('/venues/<int:venue_id>')
+@readOnly
+@cachedPage('venue')
 def show_venue(venue_id):
     venue = Venue.query.get(venue_id)
-    upcomingShows = getVenueUpcomingShows(venue)
-    pastShows = getVenuePastShows(venue)
+    if venue is None or venue.deleted_at is not None:
+        abort(404)
     genres = []
-    for g in venue.genres:
-        genres.append(g.name)
+    for genre in venue.genres:
+        genres.append(genre.name)
     data = {
         'id': venue.id,
         'name': venue.name,
         'city': venue.city,
         'state': venue.city.state,
-        'upcoming_shows_count': len(upcomingShows),
-        'upcoming_shows': upcomingShows,
-        'past_shows': pastShows,
-        'past_shows_count': len(pastShows),
+        **getShowTimeline(Venue, venue.id),
         'genres': genres,
         'facebook_link': venue.facebook_link,
         'website': venue.website,
@@ -352,19 +667,103 @@ def create_venue_submission():
     return render_template('pages/home.html')
 
 
+PURGE_BATCH_SIZE = 1000
+purgeExecutor = ThreadPoolExecutor(max_workers=1)
+
+
+def purgeListing(model, entity_id, batch_size=PURGE_BATCH_SIZE):
+    """Deletes a venue's or artist's shows in batches, then the row itself
+
+    Each batch commits on its own so no lock is held for the whole
+    history; genre links go with the row through ON DELETE CASCADE.
+    """
+    owner_id, counterpart = showColumns(model)
+    counterpart_ids = showCounterparts(owner_id, counterpart, entity_id)
+    while True:
+        batch = db.session.query(Show.id).filter(
+            owner_id == entity_id).limit(batch_size)
+        deleted = Show.query.filter(Show.id.in_(batch.scalar_subquery())) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+        if deleted < batch_size:
+            break
+    model.query.filter(model.id == entity_id).delete(synchronize_session=False)
+    refreshCounterparts(model, counterpart_ids)
+    db.session.commit()
+    invalidateListingPages(model, entity_id, counterpart_ids)
+
+
+def showColumns(model):
+    """The (own, counterpart) id columns of Show for a venue or an artist"""
+    return (Show.venue_id, Show.artist_id) if model is Venue \
+        else (Show.artist_id, Show.venue_id)
+
+
+def invalidateListingPages(model, entity_id, counterpart_ids):
+    if model is Venue:
+        invalidatePages([entity_id], counterpart_ids)
+    else:
+        invalidatePages(counterpart_ids, [entity_id])
+
+
+def refreshCounterparts(model, counterpart_ids):
+    if model is Venue:
+        refreshShowCounters(db.session, artist_ids=counterpart_ids)
+    else:
+        refreshShowCounters(db.session, venue_ids=counterpart_ids)
+
+
+def purgeInBackground(model, entity_id):
+    with app.app_context():
+        try:
+            purgeListing(model, entity_id)
+        except Exception:
+            app.logger.exception('Purging %s %s failed' % (model.__tablename__, entity_id))
+        finally:
+            db.session.remove()
+
+
+def deleteListing(model, entity_id):
+    """Deletes a venue or an artist with set-based statements
+
+    By default the row is deleted with one statement and the database
+    cascades to its shows and genre links; the show counters of the other
+    side of its shows are recounted in the same transaction. With
+    DELETE_MODE = 'background' the row is only marked deleted, which hides
+    it everywhere at once, and its history is purged in batches off the
+    request. Until that purge runs, the show counters of the other side
+    still include the hidden listing's shows.
+    """
+    if app.config['DELETE_MODE'] == 'background':
+        deleted = model.query.filter(
+            model.id == entity_id, model.deleted_at.is_(None)
+        ).update({'deleted_at': datetime.datetime.now()}, synchronize_session=False)
+        db.session.commit()
+        if deleted:
+            # finding the pages that list its shows would take the scan the
+            # purge runs later, so drop every cached page instead
+            pageCache.invalidate()
+            purgeExecutor.submit(purgeInBackground, model, entity_id)
+    else:
+        counterpart_ids = showCounterparts(*showColumns(model), entity_id)
+        deleted = model.query.filter(model.id == entity_id) \
+            .delete(synchronize_session=False)
+        refreshCounterparts(model, counterpart_ids)
+        db.session.commit()
+        if deleted:
+            invalidateListingPages(model, entity_id, counterpart_ids)
+    return deleted
+
+
 @app.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     error = False
     try:
-        venue = Venue.query.get(venue_id)
-        for show in venue.shows:
-            db.session.delete(show)
-
-        db.session.delete(venue)
-        db.session.commit()
-    except():
+        if not deleteListing(Venue, venue_id):
+            abort(404)
+    except SQLAlchemyError:
         flash('An error occurred. Venue ' +
-              venue_id + ' could not be listed.')
+              venue_id + ' could not be deleted.')
         db.session.rollback()
         error = True
     else:
@@ -377,46 +776,69 @@ def delete_venue(venue_id):
     else:
         return jsonify({'success': True})
 
+
+@app.route('/artists/<int:artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+    error = False
+    try:
+        if not deleteListing(Artist, artist_id):
+            abort(404)
+    except SQLAlchemyError:
+        flash('An error occurred. Artist %s could not be deleted.' % artist_id)
+        db.session.rollback()
+        error = True
+    else:
+        flash('Artist was successfully deleted!')
+    finally:
+        db.session.close()
+
+    if error:
+        abort(500)
+    else:
+        return jsonify({'success': True})
+
 #  Artists
 #  ----------------------------------------------------------------
 
 
 @app.route('/artists')
+@readOnly
 def artists():
-    data = Artist.query.all()
-    return render_template('pages/artists.html', artists=data)
+    data, next_cursor = getKeysetPage(
+        db.session.query(Artist.id, Artist.name).filter(Artist.deleted_at.is_(None)),
+        (Artist.name, Artist.id),
+        request.args.get('after'),
+        request.args.get('limit', PAGE_SIZE, type=int))
+    return streamTemplate('pages/artists.html', artists=data, next_cursor=next_cursor)
 
 
 @app.route('/artists/search', methods=['POST'])
+@readOnly
 def search_artists():
     search_term = request.form.get('search_term', '')
-    query = Artist.query.filter(Artist.name.ilike(f'%{search_term}%'))
-    response = {
-        "count": query.count(),
-        "data": query.all()
-    }
+    response = searchByName(db.session, Artist, search_term,
+                            app.config['SEARCH_PAGE_LIMIT'], streamRows)
 
-    return render_template('pages/search_artists.html', results=response, search_term=search_term)
+    return streamTemplate('pages/search_artists.html', results=response, search_term=search_term)
 
 
 @app.route('/artists/<int:artist_id>')
+@readOnly
+@cachedPage('artist')
 def show_artist(artist_id):
     artist = Artist.query.get(artist_id)
-    upcomingShows = getArtistUpcomingShows(artist)
-    pastShows = getArtistPastShows(artist)
+    if artist is None or artist.deleted_at is not None:
+        abort(404)
     genres = []
-    for g in artist.genres:
-        genres.append(g.name)
+    for genre in artist.genres:
+        genres.append(genre.name)
 
     data = {
         'id': artist.id,
         'name': artist.name,
         'city': artist.city,
         'state': artist.city.state,
-        'upcoming_shows_count': len(upcomingShows),
-        'upcoming_shows': upcomingShows,
-        'past_shows': pastShows,
-        'past_shows_count': len(pastShows),
+        **getShowTimeline(Artist, artist.id),
         'genres': genres,
         'facebook_link': artist.facebook_link,
         'website': artist.website,
@@ -458,6 +880,8 @@ def edit_artist_submission(artist_id):
 
         db.session.add(artist)
         db.session.commit()
+        invalidatePages(
+            showCounterparts(Show.artist_id, Show.venue_id, artist_id), [artist_id])
     except:
         error = True
         db.session.rollback()
@@ -497,6 +921,8 @@ def edit_venue_submission(venue_id):
 
         db.session.add(venue)
         db.session.commit()
+        invalidatePages(
+            [venue_id], showCounterparts(Show.venue_id, Show.artist_id, venue_id))
     except:
         error = True
         db.session.rollback()
@@ -548,21 +974,38 @@ def create_artist_submission():
 #  Shows
 #  ----------------------------------------------------------------
 
+def listedShows():
+    """Shows of listed venues and artists with the columns the views show"""
+    return db.session.query(
+        Show.id, Show.start_time,
+        Venue.id.label('venue_id'), Venue.name.label('venue_name'),
+        Artist.id.label('artist_id'), Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).join(Venue, Venue.id == Show.venue_id) \
+        .join(Artist, Artist.id == Show.artist_id) \
+        .filter(Venue.deleted_at.is_(None), Artist.deleted_at.is_(None))
+
+
 @app.route('/shows')
+@readOnly
 def shows():
-    shows = Show.query.all()
+    shows, next_cursor = getKeysetPage(
+        listedShows(),
+        (Show.start_time, Show.id),
+        request.args.get('after'),
+        request.args.get('limit', PAGE_SIZE, type=int))
     data = []
     for item in shows:
         data.append({
-            'venue_id': item.venue.id,
-            'venue_name': item.venue.name,
-            'artist_id': item.artist.id,
-            'artist_name': item.artist.name,
-            'artist_image_link': item.artist.image_link,
-            'start_time': item.start_time.isoformat()
+            'venue_id': item.venue_id,
+            'venue_name': item.venue_name,
+            'artist_id': item.artist_id,
+            'artist_name': item.artist_name,
+            'artist_image_link': item.artist_image_link,
+            'start_time': item.start_time
         })
 
-    return render_template('pages/shows.html', shows=data)
+    return streamTemplate('pages/shows.html', shows=data, next_cursor=next_cursor)
 
 
 @app.route('/shows/create')
@@ -585,12 +1028,13 @@ def create_show_submission():
         elif artist is None:
             raise ValueError('Artist id is not listed.')
 
-        newShow = Show(start_time=form.get('start_time'))
+        newShow = Show(start_time=dateutil.parser.parse(form.get('start_time')))
         newShow.artist = artist
         newShow.venue = venue
 
         db.session.add(newShow)
         db.session.commit()
+        invalidatePages([form.get('venue_id')], [form.get('artist_id')])
     except ValueError as err:
         db.session.rollback()
         flash(err.args if err.args else 'An error occurred. Show could not be listed.')
@@ -602,13 +1046,191 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
+#  JSON API
+#  ----------------------------------------------------------------
+
+API_PREFIX = '/api/v1'
+LISTING_FIELDS = ('id', 'name', 'city', 'state', 'image_link',
+                  'upcoming_shows_count', 'past_shows_count')
+SEARCH_FIELDS = ('id', 'name', 'upcoming_shows_count', 'past_shows_count')
+SHOW_FIELDS = ('id', 'start_time', 'venue_id', 'venue_name', 'artist_id',
+               'artist_name', 'artist_image_link')
+TIMELINE_FIELDS = ('upcoming_shows', 'past_shows')
+DETAIL_FIELDS = {
+    'venues': LISTING_FIELDS + (
+        'genres', 'address', 'phone', 'website', 'facebook_link',
+        'seeking_talent', 'seeking_description') + TIMELINE_FIELDS,
+    'artists': LISTING_FIELDS + (
+        'genres', 'phone', 'website', 'facebook_link', 'seeking_venue',
+        'seeking_description') + TIMELINE_FIELDS
+}
+
+
+def requestedFields(allowed):
+    try:
+        return parseFields(request.args.get('fields'), allowed)
+    except ValueError as err:
+        abort(400, description=str(err))
+
+
+def listingColumns(model):
+    return {
+        'id': model.id,
+        'name': model.name,
+        'city': City.name,
+        'state': State.name,
+        'image_link': model.image_link,
+        'upcoming_shows_count': model.upcoming_shows_count,
+        'past_shows_count': model.past_shows_count
+    }
+
+
+def listedEntities(model):
+    return db.session.query(model) \
+        .outerjoin(City, City.id == model.city_id) \
+        .outerjoin(State, State.id == City.state_id) \
+        .filter(model.deleted_at.is_(None))
+
+
+def apiPage(query, columns, order, fields):
+    """Returns one keyset page of `query` selecting only `fields`
+
+    The ordering columns are selected as well under their own key, which
+    must also be their key in `columns`, so the next cursor can be read.
+    """
+    selected = fields + tuple(
+        column.key for column in order if column.key not in fields)
+    rows, next_cursor = getKeysetPage(
+        query.with_entities(*[columns[name].label(name) for name in selected]),
+        order,
+        request.args.get('after'),
+        request.args.get('limit', PAGE_SIZE, type=int))
+    return jsonResponse({
+        'data': [{name: getattr(row, name) for name in fields} for row in rows],
+        'next': next_cursor
+    })
+
+
+def apiDetails(model, entity_id):
+    fields = requestedFields(DETAIL_FIELDS[model.__tablename__])
+    entity = model.query.get(entity_id)
+    if entity is None or entity.deleted_at is not None:
+        abort(404)
+
+    data = {}
+    for field in fields:
+        if field == 'city':
+            data[field] = entity.city.name if entity.city else None
+        elif field == 'state':
+            data[field] = entity.city.state.name \
+                if entity.city and entity.city.state else None
+        elif field == 'genres':
+            data[field] = [genre.name for genre in entity.genres]
+        elif field not in TIMELINE_FIELDS:
+            data[field] = getattr(entity, field)
+    if any(field in TIMELINE_FIELDS for field in fields):
+        timeline = getShowTimeline(model, entity.id)
+        for field in TIMELINE_FIELDS:
+            if field in fields:
+                data[field] = timeline[field]
+    return jsonResponse({'data': data})
+
+
+def apiSearch(model):
+    fields = requestedFields(SEARCH_FIELDS)
+    results = searchByName(db.session, model, request.args.get('q', ''))
+    return jsonResponse({
+        'count': results['count'],
+        'data': [{name: getattr(row, name) for name in fields}
+                 for row in results['data']]
+    })
+
+
+@app.route(API_PREFIX + '/venues')
+@readOnly
+def api_venues():
+    return apiPage(listedEntities(Venue), listingColumns(Venue),
+                   (Venue.name, Venue.id), requestedFields(LISTING_FIELDS))
+
+
+@app.route(API_PREFIX + '/venues/search')
+@readOnly
+def api_search_venues():
+    return apiSearch(Venue)
+
+
+@app.route(API_PREFIX + '/venues/<int:venue_id>')
+@readOnly
+def api_venue(venue_id):
+    return apiDetails(Venue, venue_id)
+
+
+@app.route(API_PREFIX + '/artists')
+@readOnly
+def api_artists():
+    return apiPage(listedEntities(Artist), listingColumns(Artist),
+                   (Artist.name, Artist.id), requestedFields(LISTING_FIELDS))
+
+
+@app.route(API_PREFIX + '/artists/search')
+@readOnly
+def api_search_artists():
+    return apiSearch(Artist)
+
+
+@app.route(API_PREFIX + '/artists/<int:artist_id>')
+@readOnly
+def api_artist(artist_id):
+    return apiDetails(Artist, artist_id)
+
+
+@app.route(API_PREFIX + '/shows')
+@readOnly
+def api_shows():
+    columns = {
+        'id': Show.id,
+        'start_time': Show.start_time,
+        'venue_id': Venue.id,
+        'venue_name': Venue.name,
+        'artist_id': Artist.id,
+        'artist_name': Artist.name,
+        'artist_image_link': Artist.image_link
+    }
+    return apiPage(listedShows(), columns, (Show.start_time, Show.id),
+                   requestedFields(SHOW_FIELDS))
+
+
+@app.route('/metrics/pool')
+def pool_metrics():
+    return jsonResponse(poolStats(db.engine))
+
+
+def apiError(error, status):
+    return jsonResponse({
+        'success': False,
+        'error': status,
+        'message': getattr(error, 'description', None) or 'error'
+    }, status)
+
+
+@app.errorhandler(400)
+def bad_request_error(error):
+    if request.path.startswith(API_PREFIX):
+        return apiError(error, 400)
+    return error
+
+
 @app.errorhandler(404)
 def not_found_error(error):
+    if request.path.startswith(API_PREFIX):
+        return apiError(error, 404)
     return render_template('errors/404.html'), 404
 
 
 @app.errorhandler(500)
 def server_error(error):
+    if request.path.startswith(API_PREFIX):
+        return apiError(error, 500)
     return render_template('errors/500.html'), 500
 
 
@@ -622,6 +1244,36 @@ def reset_db():
     print("Initialized default DB")
 
 
+@app.cli.command('purge')
+def purge_deleted():
+    """Purges venues and artists left marked deleted"""
+
+    for model in (Venue, Artist):
+        ids = [id for id, in db.session.query(model.id).filter(
+            model.deleted_at.isnot(None))]
+        for id in ids:
+            purgeListing(model, id)
+        print("Purged %s %s" % (len(ids), model.__tablename__))
+
+
+@app.cli.command('roll-show-counters')
+@click.option('--rebuild', is_flag=True,
+              help='Recount every venue and artist instead of the ones with '
+                   'shows started since the last run.')
+def roll_show_counters(rebuild):
+    """Moves started shows from the upcoming to the past counters
+
+    Run it every few minutes from cron; between runs a show that already
+    started still counts as upcoming on the listings.
+    """
+
+    venue_ids, artist_ids = rollShowCounters(rebuild=rebuild)
+    if venue_ids is None:
+        print("Recounted all venues and artists")
+    else:
+        print("Recounted %s venues and %s artists" % (len(venue_ids), len(artist_ids)))
+
+
 @app.cli.command('bootstrap')
 def bootstrap_data():
     """Populates database with data"""
@@ -781,6 +1433,155 @@ def bootstrap_data():
     db.session.commit()
 
 
+
+def resolveLookupIds(records):
+    """Resolves states, cities and genres of an import chunk in bulk
+
+    Returns the city id of every record and the genre ids by name, with a
+    couple of set-based statements per table instead of one per record.
+    """
+    states = {record['state'] for record in records}
+    insertMissing(State, [{'name': name} for name in states], ['name'])
+    stateIds = dict(db.session.query(State.name, State.id)
+                    .filter(State.name.in_(states)))
+
+    cities = {(record['city'], stateIds[record['state']]) for record in records}
+    insertMissing(City, [{'name': name, 'state_id': state_id}
+                         for name, state_id in cities], ['name', 'state_id'])
+    cityIds = {
+        (name, state_id): id for id, name, state_id in db.session.query(
+            City.id, City.name, City.state_id).filter(
+            City.name.in_({name for name, _ in cities}),
+            City.state_id.in_(set(stateIds.values())))
+    }
+
+    genres = {genre for record in records for genre in record['genres']}
+    if genres:
+        insertMissing(Genres, [{'name': name} for name in genres], ['name'])
+    genreIds = dict(db.session.query(Genres.name, Genres.id)
+                    .filter(Genres.name.in_(genres)))
+
+    return [cityIds[(record['city'], stateIds[record['state']])]
+            for record in records], genreIds
+
+
+def insertReturningIds(table, rows):
+    if db.session.connection().dialect.name == 'postgresql':
+        return [row.id for row in db.session.execute(
+            table.insert().values(rows).returning(table.c.id))]
+    return [db.session.execute(table.insert(), row).inserted_primary_key[0]
+            for row in rows]
+
+
+def importListings(model, association, fields, booleans, records):
+    records = [dict(record, genres=parseList(record.get('genres')))
+               for record in records]
+    cityIds, genreIds = resolveLookupIds(records)
+
+    rows = []
+    for record, city_id in zip(records, cityIds):
+        row = {field: record.get(field) or None for field in fields}
+        row.update({field: parseBoolean(record.get(field)) for field in booleans})
+        row['city_id'] = city_id
+        rows.append(row)
+    ids = insertReturningIds(model.__table__, rows)
+
+    owner = association.c.venue_id if model is Venue else association.c.artist_id
+    links = [{owner.key: id, 'genre_id': genreIds[genre]}
+             for id, record in zip(ids, records)
+             for genre in dict.fromkeys(record['genres'])]
+    if links:
+        db.session.execute(association.insert(), links)
+    db.session.commit()
+
+
+def importShows(records):
+    rows = [{
+        'venue_id': int(record['venue_id']),
+        'artist_id': int(record['artist_id']),
+        'start_time': dateutil.parser.parse(record['start_time'])
+        if isinstance(record['start_time'], str) else record['start_time']
+    } for record in records]
+    db.session.execute(Show.__table__.insert(), rows)
+    refreshShowCounters(db.session, [row['venue_id'] for row in rows],
+                        [row['artist_id'] for row in rows])
+    db.session.commit()
+
+
+IMPORTERS = {
+    'venues': lambda records: importListings(
+        Venue, VenueGenres,
+        ('name', 'address', 'phone', 'website', 'image_link',
+         'facebook_link', 'seeking_description'),
+        ('seeking_talent',), records),
+    'artists': lambda records: importListings(
+        Artist, ArtistGenres,
+        ('name', 'phone', 'website', 'image_link', 'facebook_link',
+         'seeking_description'),
+        ('seeking_venue',), records),
+    'shows': importShows
+}
+
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(IMPORTERS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', default=1000, show_default=True,
+              help='Records inserted and committed per transaction.')
+@click.option('--restart', is_flag=True,
+              help='Ignore the progress saved by a previous failed run.')
+def import_data(kind, path, chunk_size, restart):
+    """Bulk imports venues, artists or shows from CSV or JSON-lines"""
+
+    def insertChunk(records):
+        try:
+            IMPORTERS[kind](records)
+        except Exception:
+            db.session.rollback()
+            raise
+
+    imported = importFile(path, insertChunk, chunk_size,
+                          resume=not restart, echo=click.echo)
+    click.echo('Imported %s %s' % (imported, kind))
+
+
+def chunks(records, size):
+    records = iter(records)
+    chunk = list(itertools.islice(records, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(records, size))
+
+
+def generateData(seed=0, venues=100, artists=100, shows=1000, chunk_size=1000):
+    """Fills an empty schema with synthetic listings through the import path"""
+    generator = DataGenerator(seed)
+    for chunk in chunks(generator.venues(venues), chunk_size):
+        IMPORTERS['venues'](chunk)
+    for chunk in chunks(generator.artists(artists), chunk_size):
+        IMPORTERS['artists'](chunk)
+    venue_ids = [id for id, in db.session.query(Venue.id).order_by(Venue.id)]
+    artist_ids = [id for id, in db.session.query(Artist.id).order_by(Artist.id)]
+    for chunk in chunks(generator.shows(shows, venue_ids, artist_ids), chunk_size):
+        IMPORTERS['shows'](chunk)
+    return generator
+
+
+@app.cli.command('generate')
+@click.option('--seed', default=0, show_default=True)
+@click.option('--venues', default=1000, show_default=True)
+@click.option('--artists', default=1000, show_default=True)
+@click.option('--shows', default=10000, show_default=True)
+def generate_data(seed, venues, artists, shows):
+    """Drops the database and fills it with seeded synthetic data"""
+
+    db.drop_all()
+    db.create_all()
+    referenceCache.invalidate()
+    generateData(seed, venues, artists, shows)
+
+    print("Generated %s venues, %s artists and %s shows" % (venues, artists, shows))
+
 if not app.debug:
     file_handler = FileHandler('error.log')
     file_handler.setFormatter(
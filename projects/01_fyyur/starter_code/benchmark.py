@@ -0,0 +1,237 @@
+#----------------------------------------------------------------------------#
+# Load-test harness.
+#
+# Seeds a database with synthetic data, runs every route of app.py through
+# the Flask test client and writes p50/p99 latency and SQL query counts per
+# route as JSON, so two runs can be compared:
+#
+#   python benchmark.py --venues 1000 --artists 1000 --shows 20000 \
+#       --output before.json
+#----------------------------------------------------------------------------#
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import datetime
+from sqlalchemy import event
+
+
+class QueryCounter(object):
+    """Counts the SQL statements sent to the engine while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def listingForm(listing):
+    form = {key: value for key, value in listing.items()
+            if isinstance(value, str)}
+    form['genres'] = listing['genres']
+    return form
+
+
+def routeCases(generator, venue_ids, artist_ids):
+    """One (method, rule, url, form) factory per route, writes last"""
+    random = generator.random
+    deletable = list(venue_ids)
+    deletableArtists = list(artist_ids)
+
+    return [
+        ('GET', '/', lambda i: ('/', None)),
+        ('GET', '/venues', lambda i: ('/venues', None)),
+        ('POST', '/venues/search', lambda i: (
+            '/venues/search', {'search_term': generator.searchTerm()})),
+        ('GET', '/venues/<int:venue_id>', lambda i: (
+            '/venues/%s' % random.choice(venue_ids), None)),
+        ('GET', '/artists', lambda i: ('/artists', None)),
+        ('POST', '/artists/search', lambda i: (
+            '/artists/search', {'search_term': generator.searchTerm()})),
+        ('GET', '/artists/<int:artist_id>', lambda i: (
+            '/artists/%s' % random.choice(artist_ids), None)),
+        ('GET', '/shows', lambda i: ('/shows', None)),
+        ('GET', '/api/v1/venues', lambda i: ('/api/v1/venues', None)),
+        ('GET', '/api/v1/venues/search', lambda i: (
+            '/api/v1/venues/search?q=%s' % generator.searchTerm(), None)),
+        ('GET', '/api/v1/venues/<int:venue_id>', lambda i: (
+            '/api/v1/venues/%s' % random.choice(venue_ids), None)),
+        ('GET', '/api/v1/artists', lambda i: ('/api/v1/artists', None)),
+        ('GET', '/api/v1/artists/search', lambda i: (
+            '/api/v1/artists/search?q=%s' % generator.searchTerm(), None)),
+        ('GET', '/api/v1/artists/<int:artist_id>', lambda i: (
+            '/api/v1/artists/%s' % random.choice(artist_ids), None)),
+        ('GET', '/api/v1/shows', lambda i: ('/api/v1/shows', None)),
+        ('GET', '/metrics/pool', lambda i: ('/metrics/pool', None)),
+        ('GET', '/venues/create', lambda i: ('/venues/create', None)),
+        ('GET', '/artists/create', lambda i: ('/artists/create', None)),
+        ('GET', '/shows/create', lambda i: ('/shows/create', None)),
+        ('GET', '/venues/<int:venue_id>/edit', lambda i: (
+            '/venues/%s/edit' % random.choice(venue_ids), None)),
+        ('GET', '/artists/<int:artist_id>/edit', lambda i: (
+            '/artists/%s/edit' % random.choice(artist_ids), None)),
+        ('POST', '/venues/create', lambda i: (
+            '/venues/create', listingForm(next(generator.venues(1))))),
+        ('POST', '/artists/create', lambda i: (
+            '/artists/create', listingForm(next(generator.artists(1))))),
+        ('POST', '/shows/create', lambda i: ('/shows/create', {
+            'venue_id': random.choice(venue_ids),
+            'artist_id': random.choice(artist_ids),
+            'start_time': '2030-01-01 20:00:00'})),
+        ('POST', '/venues/<int:venue_id>/edit', lambda i: (
+            '/venues/%s/edit' % random.choice(venue_ids),
+            listingForm(next(generator.venues(1))))),
+        ('POST', '/artists/<int:artist_id>/edit', lambda i: (
+            '/artists/%s/edit' % random.choice(artist_ids),
+            listingForm(next(generator.artists(1))))),
+        ('DELETE', '/venues/<venue_id>', lambda i: (
+            '/venues/%s' % deletable.pop(), None)),
+        ('DELETE', '/artists/<int:artist_id>', lambda i: (
+            '/artists/%s' % deletableArtists.pop(), None)),
+    ]
+
+
+def legacyFormatDatetime(value, format='medium'):
+    """The datetime filter before it took datetimes and cached patterns"""
+    import babel.dates
+    import dateutil.parser
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def benchmarkDatetimeFilter(rows=5000, format='full'):
+    """Times formatting one page of `rows` show times with both filters
+
+    The legacy filter gets the pre-formatted strings the views used to
+    pass, the current one the datetimes they pass now.
+    """
+    from app import format_datetime
+    anchor = datetime.datetime(2030, 1, 1, 20)
+    times = [anchor + datetime.timedelta(hours=i) for i in range(rows)]
+    strings = [value.strftime('%Y-%m-%d %H:%M:%S') for value in times]
+
+    start = time.perf_counter()
+    legacy = [legacyFormatDatetime(value, format) for value in strings]
+    legacy_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    current = [format_datetime(value, format) for value in times]
+    current_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        'rows': rows,
+        'legacy_ms': round(legacy_ms, 3),
+        'current_ms': round(current_ms, 3),
+        'speedup': round(legacy_ms / current_ms, 1) if current_ms else None,
+        'identical': legacy == current
+    }
+
+
+def runBenchmark(app, engine, cases, iterations=50):
+    client = app.test_client()
+    routes = {}
+    for method, rule, request in cases:
+        timings, queries, statuses = [], [], {}
+        for i in range(iterations):
+            url, form = request(i)
+            with QueryCounter(engine) as counter:
+                start = time.perf_counter()
+                response = client.open(url, method=method, data=form)
+                response.get_data()
+                response.close()
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(counter.count)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        routes['%s %s' % (method, rule)] = {
+            'requests': iterations,
+            'p50_ms': round(percentile(timings, 0.5), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'queries_p50': percentile(queries, 0.5),
+            'queries_max': max(queries),
+            'status': {str(code): count for code, count in statuses.items()}
+        }
+
+    covered = {(method, rule) for method, rule, _ in cases}
+    uncovered = sorted(
+        '%s %s' % (method, rule.rule) for rule in app.url_map.iter_rules()
+        for method in rule.methods - {'HEAD', 'OPTIONS'}
+        if rule.endpoint != 'static' and (method, rule.rule) not in covered)
+    return routes, uncovered
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database', default='sqlite:///' + os.path.join(
+        tempfile.gettempdir(), 'fyyur-benchmark.db'))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=1000)
+    parser.add_argument('--shows', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--output', default='benchmark.json')
+    args = parser.parse_args(argv)
+
+    from app import app, db, Venue, Artist, generateData, referenceCache
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database
+    app.logger.setLevel(logging.WARNING)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        referenceCache.invalidate()
+        start = time.perf_counter()
+        generator = generateData(args.seed, args.venues, args.artists, args.shows)
+        seeded = time.perf_counter() - start
+        venue_ids = [id for id, in db.session.query(Venue.id).order_by(Venue.id)]
+        artist_ids = [id for id, in db.session.query(Artist.id).order_by(Artist.id)]
+        db.session.remove()
+
+        routes, uncovered = runBenchmark(
+            app, db.engine, routeCases(generator, venue_ids, artist_ids),
+            min(args.iterations, len(venue_ids), len(artist_ids)))
+
+    results = {
+        'seed': args.seed,
+        'sizes': {'venues': args.venues, 'artists': args.artists, 'shows': args.shows},
+        'seed_seconds': round(seeded, 3),
+        'routes': routes,
+        'uncovered': uncovered,
+        'datetime_filter': benchmarkDatetimeFilter()
+    }
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+
+    for route, stats in routes.items():
+        print('%-36s p50 %8.2fms  p99 %8.2fms  queries %s'
+              % (route, stats['p50_ms'], stats['p99_ms'], stats['queries_p50']))
+    filter = results['datetime_filter']
+    print('datetime filter, %s rows: %.2fms (was %.2fms, %sx)'
+          % (filter['rows'], filter['current_ms'], filter['legacy_ms'], filter['speedup']))
+    if uncovered:
+        print('Routes without a benchmark case: %s' % ', '.join(uncovered))
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
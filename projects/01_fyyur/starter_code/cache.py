@@ -0,0 +1,126 @@
+#----------------------------------------------------------------------------#
+# In-process caches: lookup tables (states, cities, genres) and rendered
+# detail pages.
+#----------------------------------------------------------------------------#
+
+import time
+import hashlib
+import datetime
+import threading
+import collections
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+
+class ReferenceCache(object):
+    """Caches rows of rarely-changing lookup tables by a natural key
+
+    Only column values are kept, so cached rows outlive the session that
+    loaded them. `get` attaches a copy to the caller's session without a
+    query. Any insert, update or delete on a watched model drops that
+    model's entries.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def watch(self, model):
+        def invalidate(mapper, connection, target):
+            self.invalidate(model)
+
+        def invalidateChanged(mapper, connection, target):
+            # backref collections mark a row dirty without touching a column
+            state = inspect(target)
+            if any(state.attrs[attr.key].history.has_changes()
+                   for attr in mapper.column_attrs):
+                self.invalidate(model)
+
+        event.listen(model, 'after_insert', invalidate)
+        event.listen(model, 'after_update', invalidateChanged)
+        event.listen(model, 'after_delete', invalidate)
+
+    def invalidate(self, model=None):
+        if model is None:
+            self.entries.clear()
+        else:
+            for key in [key for key in self.entries if key[0] is model]:
+                self.entries.pop(key, None)
+
+    def put(self, key, instance):
+        model = type(instance)
+        self.entries[(model, key)] = {
+            attr.key: getattr(instance, attr.key)
+            for attr in inspect(model).column_attrs
+        }
+
+    def get(self, session, model, key):
+        values = self.entries.get((model, key))
+        if values is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        instance = model(**values)
+        make_transient_to_detached(instance)
+        return session.merge(instance, load=False)
+
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
+class CachedPage(object):
+
+    def __init__(self, body, created):
+        self.body = body
+        self.etag = hashlib.sha1(body.encode('utf-8')).hexdigest()
+        self.last_modified = datetime.datetime.utcfromtimestamp(int(created))
+        self.created = created
+
+
+class PageCache(object):
+    """LRU cache of rendered pages with a time to live
+
+    The cache is per process: writes invalidate the pages they touch in
+    the worker that handled them, and the TTL bounds how long other
+    workers (and the upcoming/past split of shows) can lag behind.
+    """
+
+    def __init__(self, max_entries=1000, ttl=300):
+        self.entries = collections.OrderedDict()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            page = self.entries.get(key)
+            if page is None or time.time() - page.created >= self.ttl:
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def put(self, key, body):
+        page = CachedPage(body, time.time())
+        with self.lock:
+            self.entries[key] = page
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return page
+
+    def invalidate(self, *keys):
+        with self.lock:
+            if not keys:
+                self.entries.clear()
+            for key in keys:
+                self.entries.pop(key, None)
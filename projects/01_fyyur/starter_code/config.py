@@ -10,5 +10,43 @@ DEBUG = True
 
 
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgres://nureddin@localhost:5432/fyyur'
-SQLALCHEMY_TRACK_MODIFICATIONS = True
\ No newline at end of file
+SQLALCHEMY_DATABASE_URI = os.environ.get(
+    'DATABASE_URL', 'postgresql://nureddin@localhost:5432/fyyur')
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Connection pool settings (DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+# DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_STATEMENT_TIMEOUT_MS) are read from
+# the environment by pooling.PooledSQLAlchemy unless set here.
+
+# Query budgets per endpoint, enforced by instrumentation.py. Requests over
+# budget fail while testing and are logged otherwise.
+SQL_SLOW_QUERY_MS = 100
+SQL_QUERY_BUDGETS = {
+    'index': 0,
+    'venues': 1,
+    'search_venues': 1,
+    'show_venue': 5,
+    'artists': 1,
+    'search_artists': 1,
+    'show_artist': 5,
+    'shows': 1,
+    'api_venues': 1,
+    'api_search_venues': 1,
+    'api_venue': 5,
+    'api_artists': 1,
+    'api_search_artists': 1,
+    'api_artist': 5,
+    'api_shows': 1,
+}
+
+# Rendered venue/artist detail pages kept per worker, see cache.PageCache.
+PAGE_CACHE_SIZE = 1000
+PAGE_CACHE_TTL = 300
+
+# 'cascade' deletes venues/artists in the request, 'background' marks them
+# deleted and purges their shows off the request; until the purge runs, the
+# show counters of their artists/venues still include those shows.
+DELETE_MODE = 'cascade'
+
+# Matches listed on one (streamed) search results page.
+SEARCH_PAGE_LIMIT = 1000
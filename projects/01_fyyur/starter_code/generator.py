@@ -0,0 +1,95 @@
+#----------------------------------------------------------------------------#
+# Seeded synthetic data for load tests.
+#
+# Records have the same shape as the `flask import` feeds. Popularity is
+# Zipf-like: a few cities, genres and venues get most of the listings and
+# shows, the long tail gets very few, like real booking data.
+#----------------------------------------------------------------------------#
+
+import random
+import datetime
+import itertools
+
+ADJECTIVES = ('Blue', 'Velvet', 'Golden', 'Electric', 'Wild', 'Silver', 'Hidden',
+              'Crimson', 'Lucky', 'Midnight', 'Rusty', 'Neon', 'Quiet', 'Royal')
+NOUNS = ('Room', 'Hall', 'Lounge', 'Garden', 'Cellar', 'Stage', 'Tavern', 'Barn',
+         'Club', 'Warehouse', 'Theater', 'Pianos', 'Petals', 'Band', 'Collective')
+GENRES = ('Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+          'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz',
+          'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll',
+          'Soul', 'Swing', 'Other')
+STATES = ('AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'DC', 'FL', 'GA', 'HI',
+          'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MT', 'NE', 'NV', 'NH',
+          'NJ', 'NM', 'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'MD', 'MA', 'MI', 'MN',
+          'MS', 'MO', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA',
+          'WV', 'WI', 'WY')
+
+
+def zipfWeights(count, exponent=1.1):
+    return list(itertools.accumulate(1 / (rank ** exponent)
+                                     for rank in range(1, count + 1)))
+
+
+class DataGenerator(object):
+    """Deterministic generator: the same seed gives the same records"""
+
+    def __init__(self, seed=0, cities=200, anchor=None):
+        self.random = random.Random(seed)
+        self.anchor = (anchor or datetime.datetime.now()).replace(
+            minute=0, second=0, microsecond=0)
+        self.cities = [('City %s' % i, self.random.choice(STATES))
+                       for i in range(cities)]
+        self.cityWeights = zipfWeights(len(self.cities))
+        self.genreWeights = zipfWeights(len(GENRES))
+
+    def name(self, i):
+        return '%s %s %s' % (self.random.choice(ADJECTIVES),
+                             self.random.choice(NOUNS), i)
+
+    def listing(self, i):
+        city, state = self.random.choices(self.cities, cum_weights=self.cityWeights)[0]
+        genres = self.random.choices(GENRES, cum_weights=self.genreWeights,
+                                     k=self.random.randint(1, 5))
+        return {
+            'name': self.name(i),
+            'city': city,
+            'state': state,
+            'genres': sorted(set(genres)),
+            'phone': '%03d-%03d-%04d' % (self.random.randint(200, 999),
+                                         self.random.randint(0, 999),
+                                         self.random.randint(0, 9999)),
+            'website': 'https://example.com/%s' % i,
+            'facebook_link': 'https://www.facebook.com/%s' % i,
+            'image_link': 'https://images.example.com/%s.jpg' % i,
+            'seeking_description': 'Looking for partners to play with.'
+        }
+
+    def venues(self, count):
+        for i in range(count):
+            venue = self.listing(i)
+            venue['address'] = '%s Main Street' % self.random.randint(1, 9999)
+            venue['seeking_talent'] = self.random.random() < 0.3
+            yield venue
+
+    def artists(self, count):
+        for i in range(count):
+            artist = self.listing(i)
+            artist['seeking_venue'] = self.random.random() < 0.3
+            yield artist
+
+    def shows(self, count, venue_ids, artist_ids, days=365):
+        """Shows spread over `days` around the anchor, skewed towards a few
+        popular venues and artists"""
+        venueWeights = zipfWeights(len(venue_ids), 0.8)
+        artistWeights = zipfWeights(len(artist_ids), 0.8)
+        for _ in range(count):
+            start_time = self.anchor + datetime.timedelta(
+                hours=self.random.randint(-days * 24, days * 24))
+            yield {
+                'venue_id': self.random.choices(venue_ids, cum_weights=venueWeights)[0],
+                'artist_id': self.random.choices(artist_ids, cum_weights=artistWeights)[0],
+                'start_time': start_time
+            }
+
+    def searchTerm(self):
+        return self.random.choice(ADJECTIVES + NOUNS)
@@ -0,0 +1,98 @@
+#----------------------------------------------------------------------------#
+# Streaming, resumable bulk import of partner feeds.
+#----------------------------------------------------------------------------#
+
+import os
+import csv
+import json
+import time
+import itertools
+
+
+def readRecords(path):
+    """Yields the records of a CSV or JSON-lines file one at a time"""
+    if path.endswith('.csv'):
+        with open(path, newline='') as file:
+            for record in csv.DictReader(file):
+                yield record
+    else:
+        with open(path) as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def parseBoolean(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y')
+    return bool(value)
+
+
+def parseList(value):
+    """Genres come as a JSON list or a comma separated CSV field"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    return [item.strip() for item in value if item and item.strip()]
+
+
+class Checkpoint(object):
+    """Remembers how many records of a file were committed
+
+    Stored next to the imported file, so running the same import again
+    skips the chunks that already made it and retries from the failed one.
+    """
+
+    def __init__(self, path):
+        self.path = path + '.progress'
+
+    def read(self):
+        try:
+            with open(self.path) as file:
+                return int(file.read().strip() or 0)
+        except (IOError, ValueError):
+            return 0
+
+    def save(self, count):
+        with open(self.path, 'w') as file:
+            file.write(str(count))
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def importFile(path, insertChunk, chunk_size=1000, resume=True, echo=print):
+    """Feeds the records of `path` to `insertChunk` in chunks
+
+    `insertChunk` must insert and commit one list of records. Progress is
+    checkpointed after each committed chunk; on failure the exception is
+    raised and the next run resumes at the failed chunk.
+    """
+    checkpoint = Checkpoint(path)
+    done = checkpoint.read() if resume else 0
+    if done:
+        echo('Resuming after %s already imported records' % done)
+
+    records = itertools.islice(readRecords(path), done, None)
+    imported = 0
+    start = time.perf_counter()
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            break
+        try:
+            insertChunk(chunk)
+        except Exception:
+            echo('Chunk starting at record %s failed, run again to resume'
+                 % (done + imported))
+            raise
+        imported += len(chunk)
+        checkpoint.save(done + imported)
+        elapsed = time.perf_counter() - start
+        echo('%s records imported (%.0f records/sec)'
+             % (done + imported, imported / elapsed if elapsed else imported))
+
+    checkpoint.clear()
+    return imported
@@ -0,0 +1,57 @@
+"""Precomputed show counters.
+
+Revision ID: 2b7e9d41c0a8
+Revises: 6472c5df1b22
+Create Date: 2026-10-18 14:05:12.730144
+
+"""
+import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b7e9d41c0a8'
+down_revision = '6472c5df1b22'
+branch_labels = None
+depends_on = None
+
+owners = (
+    ('venues', 'venue_id'),
+    ('artists', 'artist_id'),
+)
+
+
+def upgrade():
+    for table, owner in owners:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('upcoming_shows_count', sa.Integer(),
+                                          nullable=False, server_default='0'))
+            batch_op.add_column(sa.Column('past_shows_count', sa.Integer(),
+                                          nullable=False, server_default='0'))
+
+    rollups = op.create_table(
+        'show_counter_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('rolled_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    now = datetime.datetime.now()
+    for table, owner in owners:
+        op.get_bind().execute(sa.text(
+            'UPDATE {table} SET '
+            'upcoming_shows_count = (SELECT count(*) FROM shows '
+            'WHERE shows.{owner} = {table}.id AND shows.start_time >= :now), '
+            'past_shows_count = (SELECT count(*) FROM shows '
+            'WHERE shows.{owner} = {table}.id AND shows.start_time < :now)'
+            .format(table=table, owner=owner)), now=now)
+    op.bulk_insert(rollups, [{'id': 1, 'rolled_at': now}])
+
+
+def downgrade():
+    op.drop_table('show_counter_rollups')
+    for table, owner in reversed(owners):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('past_shows_count')
+            batch_op.drop_column('upcoming_shows_count')
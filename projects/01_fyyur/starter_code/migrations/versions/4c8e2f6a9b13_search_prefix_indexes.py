@@ -0,0 +1,40 @@
+"""Search prefix indexes.
+
+Rebuilds the SQLite FTS5 name search tables with prefix indexes. The
+triggers keeping them in sync refer to the tables by name and stay.
+
+Revision ID: 4c8e2f6a9b13
+Revises: 9d3f5a7c1e24
+Create Date: 2026-10-18 19:02:13.604518
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '4c8e2f6a9b13'
+down_revision = '9d3f5a7c1e24'
+branch_labels = None
+depends_on = None
+
+tables = ('venues', 'artists')
+
+
+def rebuild(options):
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table in tables:
+        op.execute('DROP TABLE IF EXISTS %s_search' % table)
+        op.execute("CREATE VIRTUAL TABLE %(t)s_search USING fts5(name, "
+                   "content='%(t)s', content_rowid='id'%(options)s)"
+                   % {'t': table, 'options': options})
+        op.execute("INSERT INTO %(t)s_search(%(t)s_search) VALUES ('rebuild')"
+                   % {'t': table})
+
+
+def upgrade():
+    rebuild(", prefix='1 2 3 4'")
+
+
+def downgrade():
+    rebuild('')
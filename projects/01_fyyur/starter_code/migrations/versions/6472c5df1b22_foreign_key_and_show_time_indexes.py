@@ -0,0 +1,60 @@
+"""Foreign key and show time indexes.
+
+Revision ID: 6472c5df1b22
+Revises: cf435f863ee1
+Create Date: 2026-10-18 12:40:55.208311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6472c5df1b22'
+down_revision = 'cf435f863ee1'
+branch_labels = None
+depends_on = None
+
+indexes = (
+    ('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time']),
+    ('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time']),
+    ('ix_shows_start_time_id', 'shows', ['start_time', 'id']),
+    ('ix_venues_city_id', 'venues', ['city_id']),
+    ('ix_artists_city_id', 'artists', ['city_id']),
+    ('ix_artists_name_id', 'artists', ['name', 'id']),
+    ('ix_cities_state_id', 'cities', ['state_id']),
+    ('ix_venue_genres_genre_id', 'venue_genres', ['genre_id']),
+    ('ix_artist_genres_genre_id', 'artist_genres', ['genre_id']),
+)
+
+associations = (
+    ('venue_genres', 'venue_id'),
+    ('artist_genres', 'artist_id'),
+)
+
+
+def upgrade():
+    for table, owner in associations:
+        # drop duplicate links before they get a unique key
+        op.execute('CREATE TABLE %s_distinct AS SELECT DISTINCT %s, genre_id '
+                   'FROM %s' % (table, owner, table))
+        op.execute('DELETE FROM %s' % table)
+        op.execute('INSERT INTO %s (%s, genre_id) SELECT %s, genre_id FROM %s_distinct'
+                   % (table, owner, owner, table))
+        op.execute('DROP TABLE %s_distinct' % table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.create_unique_constraint(
+                '%s_%s_genre_id_key' % (table, owner), [owner, 'genre_id'])
+
+    for name, table, columns in indexes:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, columns in reversed(indexes):
+        op.drop_index(name, table_name=table)
+
+    for table, owner in associations:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_constraint(
+                '%s_%s_genre_id_key' % (table, owner), type_='unique')
@@ -0,0 +1,70 @@
+"""Unique lookup names.
+
+Merges duplicate states, cities and genres into the row with the lowest
+id, then adds the unique keys the get-or-insert upserts rely on.
+
+Revision ID: 83bbda387bc6
+Revises: cead0c534562
+Create Date: 2026-10-18 10:03:27.540961
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '83bbda387bc6'
+down_revision = 'cead0c534562'
+branch_labels = None
+depends_on = None
+
+
+def merge(table, columns, references):
+    """Points `references` at the first row of each duplicate group of
+    `table` and deletes the others
+
+    Rows with a NULL key column are never duplicates, as for the unique
+    keys added below, so they and their references are left alone.
+    """
+    match = ' AND '.join('d.%s = o.%s' % (column, column) for column in columns)
+    notNull = ' AND '.join('%s IS NOT NULL' % column for column in columns)
+    for ref_table, ref_column in references:
+        # only references to a row with a lower-id duplicate move
+        op.execute(
+            'UPDATE %(ref_table)s SET %(ref_column)s = ('
+            'SELECT MIN(d.id) FROM %(table)s o JOIN %(table)s d ON %(match)s '
+            'WHERE o.id = %(ref_table)s.%(ref_column)s) '
+            'WHERE %(ref_column)s IN ('
+            'SELECT o.id FROM %(table)s o JOIN %(table)s d ON %(match)s '
+            'AND d.id < o.id)' % {
+                'ref_table': ref_table, 'ref_column': ref_column,
+                'table': table, 'match': match})
+    op.execute('DELETE FROM %(table)s WHERE %(notNull)s AND id NOT IN '
+               '(SELECT MIN(id) FROM %(table)s WHERE %(notNull)s '
+               'GROUP BY %(columns)s)' % {
+                   'table': table, 'notNull': notNull,
+                   'columns': ', '.join(columns)})
+
+
+def upgrade():
+    merge('states', ['name'], [('cities', 'state_id')])
+    merge('cities', ['name', 'state_id'],
+          [('venues', 'city_id'), ('artists', 'city_id')])
+    merge('genres', ['name'],
+          [('venue_genres', 'genre_id'), ('artist_genres', 'genre_id')])
+
+    with op.batch_alter_table('states') as batch_op:
+        batch_op.create_unique_constraint('states_name_key', ['name'])
+    with op.batch_alter_table('cities') as batch_op:
+        batch_op.create_unique_constraint(
+            'cities_name_state_id_key', ['name', 'state_id'])
+    with op.batch_alter_table('genres') as batch_op:
+        batch_op.create_unique_constraint('genres_name_key', ['name'])
+
+
+def downgrade():
+    with op.batch_alter_table('genres') as batch_op:
+        batch_op.drop_constraint('genres_name_key', type_='unique')
+    with op.batch_alter_table('cities') as batch_op:
+        batch_op.drop_constraint('cities_name_state_id_key', type_='unique')
+    with op.batch_alter_table('states') as batch_op:
+        batch_op.drop_constraint('states_name_key', type_='unique')
@@ -0,0 +1,23 @@
+"""Venue name index.
+
+Revision ID: 9d3f5a7c1e24
+Revises: 2b7e9d41c0a8
+Create Date: 2026-10-18 15:22:47.018536
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3f5a7c1e24'
+down_revision = '2b7e9d41c0a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_venues_name_id', 'venues', ['name', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_venues_name_id', table_name='venues')
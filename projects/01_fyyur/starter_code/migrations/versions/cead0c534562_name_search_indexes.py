@@ -0,0 +1,56 @@
+"""Name search indexes.
+
+Revision ID: cead0c534562
+Revises: 57156c331c3e
+Create Date: 2026-10-18 09:12:41.118202
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'cead0c534562'
+down_revision = '57156c331c3e'
+branch_labels = None
+depends_on = None
+
+tables = ('venues', 'artists')
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table in tables:
+            op.execute('CREATE INDEX IF NOT EXISTS ix_%s_name_trgm '
+                       'ON %s USING gin (name gin_trgm_ops)' % (table, table))
+    elif dialect == 'sqlite':
+        for table in tables:
+            op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS %(t)s_search "
+                       "USING fts5(name, content='%(t)s', content_rowid='id')"
+                       % {'t': table})
+            op.execute("CREATE TRIGGER %(t)s_search_insert AFTER INSERT ON %(t)s BEGIN "
+                       "INSERT INTO %(t)s_search(rowid, name) VALUES (new.id, new.name); END"
+                       % {'t': table})
+            op.execute("CREATE TRIGGER %(t)s_search_delete AFTER DELETE ON %(t)s BEGIN "
+                       "INSERT INTO %(t)s_search(%(t)s_search, rowid, name) "
+                       "VALUES ('delete', old.id, old.name); END" % {'t': table})
+            op.execute("CREATE TRIGGER %(t)s_search_update AFTER UPDATE OF name ON %(t)s BEGIN "
+                       "INSERT INTO %(t)s_search(%(t)s_search, rowid, name) "
+                       "VALUES ('delete', old.id, old.name); "
+                       "INSERT INTO %(t)s_search(rowid, name) VALUES (new.id, new.name); END"
+                       % {'t': table})
+            op.execute("INSERT INTO %(t)s_search(%(t)s_search) VALUES ('rebuild')"
+                       % {'t': table})
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table in tables:
+            op.execute('DROP INDEX IF EXISTS ix_%s_name_trgm' % table)
+    elif dialect == 'sqlite':
+        for table in tables:
+            for trigger in ('insert', 'delete', 'update'):
+                op.execute('DROP TRIGGER IF EXISTS %s_search_%s' % (table, trigger))
+            op.execute('DROP TABLE IF EXISTS %s_search' % table)
@@ -0,0 +1,53 @@
+"""Cascading listing deletes.
+
+Shows and genre links now go with their venue or artist through
+ON DELETE CASCADE, and venues/artists get a deleted_at column for the
+background purge mode. SQLite databases are built with `flask initdb`,
+which already creates the cascading keys, so only PostgreSQL has its
+foreign keys rebuilt here.
+
+Revision ID: cf435f863ee1
+Revises: 83bbda387bc6
+Create Date: 2026-10-18 11:21:09.640187
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cf435f863ee1'
+down_revision = '83bbda387bc6'
+branch_labels = None
+depends_on = None
+
+foreign_keys = (
+    ('shows', 'venue_id', 'venues'),
+    ('shows', 'artist_id', 'artists'),
+    ('venue_genres', 'venue_id', 'venues'),
+    ('artist_genres', 'artist_id', 'artists'),
+)
+
+
+def replace_foreign_keys(ondelete):
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, column, referent in foreign_keys:
+        name = '%s_%s_fkey' % (table, column)
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referent, [column], ['id'],
+                              ondelete=ondelete)
+
+
+def upgrade():
+    op.add_column('venues', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.add_column('artists', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    replace_foreign_keys(None)
+    with op.batch_alter_table('artists') as batch_op:
+        batch_op.drop_column('deleted_at')
+    with op.batch_alter_table('venues') as batch_op:
+        batch_op.drop_column('deleted_at')
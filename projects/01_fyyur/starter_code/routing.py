@@ -0,0 +1,99 @@
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#
+# Views marked with @readOnly run their queries on one of the replicas in
+# SQLALCHEMY_REPLICA_URIS (DATABASE_REPLICA_URLS in the environment, comma
+# separated); everything else, and any write, goes to the primary. After a
+# client writes, its reads stay on the primary for REPLICA_STICKY_SECONDS
+# so it reads its own writes while the replicas catch up.
+#----------------------------------------------------------------------------#
+
+import os
+import time
+import random
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import create_engine, orm
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.sql.dml import UpdateBase
+
+from pooling import PooledSQLAlchemy
+
+STICKY_COOKIE = 'db_write_at'
+
+
+def readOnly(view):
+    """Marks a view whose queries may run on a replica"""
+    view.read_only = True
+    return view
+
+
+class RoutingSession(SignallingSession):
+
+    def get_bind(self, mapper=None, clause=None):
+        if has_request_context():
+            if self._flushing or isinstance(clause, UpdateBase):
+                g.db_wrote = True
+            elif not g.get('db_wrote'):
+                # once a request wrote, it reads its writes from the primary
+                replica = g.get('db_replica')
+                if replica is not None:
+                    return replica
+        return SignallingSession.get_bind(self, mapper, clause)
+
+
+class RoutingSQLAlchemy(PooledSQLAlchemy):
+    """PooledSQLAlchemy sending the queries of read-only views to replicas"""
+
+    def __init__(self, *args, **kwargs):
+        self.replicas = {}
+        super(RoutingSQLAlchemy, self).__init__(*args, **kwargs)
+
+    def init_app(self, app):
+        app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [
+            url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',')
+            if url.strip()])
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 5)
+        super(RoutingSQLAlchemy, self).init_app(app)
+        app.before_request(self._route)
+        app.after_request(self._stick)
+        app.teardown_request(self._unroute)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def get_replica(self, app, uri):
+        """The engine of a replica, created with the primary's pool settings"""
+        engine = self.replicas.get(uri)
+        if engine is None:
+            sa_url, options = make_url(uri), {}
+            rv = self.apply_driver_hacks(app, sa_url, options)
+            if rv is not None:
+                sa_url, options = rv
+            engine = self.replicas[uri] = create_engine(sa_url, **options)
+        return engine
+
+    def _route(self):
+        app = current_app._get_current_object()
+        uris = app.config['SQLALCHEMY_REPLICA_URIS']
+        view = app.view_functions.get(request.endpoint)
+        if not uris or not getattr(view, 'read_only', False):
+            return
+        try:
+            wrote_at = float(request.cookies.get(STICKY_COOKIE, 0))
+        except ValueError:
+            wrote_at = 0
+        if time.time() - wrote_at >= app.config['REPLICA_STICKY_SECONDS']:
+            g.db_replica = self.get_replica(app, random.choice(uris))
+
+    def _stick(self, response):
+        config = current_app.config
+        if g.pop('db_wrote', False) and config['SQLALCHEMY_REPLICA_URIS']:
+            response.set_cookie(STICKY_COOKIE, '%.3f' % time.time(),
+                                max_age=config['REPLICA_STICKY_SECONDS'],
+                                httponly=True)
+        return response
+
+    def _unroute(self, error):
+        # streamed pages keep reading from the replica until they are sent
+        g.pop('db_replica', None)
@@ -0,0 +1,124 @@
+#----------------------------------------------------------------------------#
+# Name search backed by an index.
+#
+# PostgreSQL uses a pg_trgm GIN index so `ILIKE '%term%'` no longer scans
+# the table, SQLite keeps an FTS5 table in sync through triggers. Both
+# return ranked rows and the match count in one round-trip.
+#
+# Only the first SEARCH_COUNT_LIMIT matches are counted and ranked, so a
+# term matching most of a large table costs the same as a rare one; the
+# count then reads as a lower bound.
+#----------------------------------------------------------------------------#
+
+import itertools
+from sqlalchemy import DDL, event, func, select, case, column, literal_column
+from sqlalchemy import table as tableClause
+
+SEARCH_LIMIT = 50
+SEARCH_COUNT_LIMIT = 1000
+# FTS5 prefix indexes, so short prefixes don't expand to every token
+SEARCH_PREFIXES = '1 2 3 4'
+COUNTER_COLUMNS = ('upcoming_shows_count', 'past_shows_count')
+
+
+def setupSearch(model):
+    """Registers the search index DDL of a model's `name` column"""
+    table = model.__table__
+    name = table.name
+
+    for statement in (
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_%(name)s_name_trgm "
+        "ON %(name)s USING gin (name gin_trgm_ops)"
+    ):
+        event.listen(table, 'after_create', DDL(
+            statement % {'name': name}).execute_if(dialect='postgresql'))
+
+    for statement in (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS %(name)s_search "
+        "USING fts5(name, content='%(name)s', content_rowid='id', "
+        "prefix='%(prefixes)s')",
+        "CREATE TRIGGER %(name)s_search_insert AFTER INSERT ON %(name)s BEGIN "
+        "INSERT INTO %(name)s_search(rowid, name) VALUES (new.id, new.name); END",
+        "CREATE TRIGGER %(name)s_search_delete AFTER DELETE ON %(name)s BEGIN "
+        "INSERT INTO %(name)s_search(%(name)s_search, rowid, name) "
+        "VALUES ('delete', old.id, old.name); END",
+        "CREATE TRIGGER %(name)s_search_update AFTER UPDATE OF name ON %(name)s BEGIN "
+        "INSERT INTO %(name)s_search(%(name)s_search, rowid, name) "
+        "VALUES ('delete', old.id, old.name); "
+        "INSERT INTO %(name)s_search(rowid, name) VALUES (new.id, new.name); END"
+    ):
+        event.listen(table, 'after_create', DDL(
+            statement % {'name': name, 'prefixes': SEARCH_PREFIXES})
+            .execute_if(dialect='sqlite'))
+
+    event.listen(table, 'before_drop', DDL(
+        "DROP TABLE IF EXISTS %s_search" % name).execute_if(dialect='sqlite'))
+
+
+def escapeLike(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def matchExpression(term):
+    """Turns a search term into an FTS5 prefix query, one token per word"""
+    return ' '.join('"%s"*' % token.replace('"', '""') for token in term.split())
+
+
+def searchByName(session, model, term, limit=SEARCH_LIMIT, execute=None):
+    """Returns up to `limit` ranked rows whose name matches `term`
+
+    The result has the shape the search templates expect: `count` is the
+    number of matches, at most SEARCH_COUNT_LIMIT (or `limit` when that is
+    higher), `data` the (id, name) rows of the first page, with the
+    precomputed show counters when the table has them. When an `execute`
+    function is given it runs the query (e.g. on a server-side cursor) and
+    `data` is an iterator over its result.
+    """
+    table = model.__table__
+    term = (term or '').strip()
+    columns = [table.c.id, table.c.name] + [
+        table.c[name] for name in COUNTER_COLUMNS if name in table.c]
+    dialect = session.connection().dialect.name
+
+    # the matching ids, bounded before they are counted and ranked
+    matches = select([table.c.id])
+    if 'deleted_at' in table.c:
+        matches = matches.where(table.c.deleted_at.is_(None))
+    if not term:
+        matches = matches.order_by(table.c.name, table.c.id)
+        ranks = [table.c.name, table.c.id]
+    elif dialect == 'sqlite':
+        search = tableClause('%s_search' % table.name, column('rowid'))
+        matches = matches \
+            .select_from(table.join(search, search.c.rowid == table.c.id)) \
+            .where(literal_column(search.name).op('MATCH')(matchExpression(term)))
+        # bm25 would score every match; shorter names are the closer ones
+        ranks = [func.length(table.c.name), table.c.name, table.c.id]
+    else:
+        pattern = escapeLike(term)
+        matches = matches \
+            .where(table.c.name.ilike('%' + pattern + '%', escape='\\'))
+        ranks = [table.c.name, table.c.id]
+        if dialect == 'postgresql':
+            ranks = [
+                case([(table.c.name.ilike(pattern + '%', escape='\\'), 0)], else_=1),
+                func.similarity(table.c.name, term).desc()] + ranks
+    matches = matches.limit(max(limit, SEARCH_COUNT_LIMIT)).subquery()
+
+    query = select(columns + [func.count().over().label('total')]) \
+        .select_from(table.join(matches, matches.c.id == table.c.id)) \
+        .order_by(*ranks) \
+        .limit(limit)
+    if execute is not None:
+        result = execute(query)
+        first = result.fetchone()
+        return {
+            'count': first.total if first else 0,
+            'data': itertools.chain([first], result) if first else iter(())
+        }
+    rows = session.execute(query).fetchall()
+    return {
+        'count': rows[0].total if rows else 0,
+        'data': rows
+    }
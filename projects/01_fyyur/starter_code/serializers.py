@@ -0,0 +1,48 @@
+#----------------------------------------------------------------------------#
+# Compact JSON for the API.
+#
+# Uses orjson when it is installed and falls back to the standard library
+# with the same compact output otherwise.
+#----------------------------------------------------------------------------#
+
+import json
+import datetime
+from flask import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError('%r is not JSON serializable' % (value,))
+
+
+def dumps(data):
+    """Serializes `data` to compact JSON bytes, datetimes as ISO 8601"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, default=_default, separators=(',', ':'),
+                      ensure_ascii=False).encode('utf-8')
+
+
+def jsonResponse(data, status=200):
+    return Response(dumps(data), status=status, mimetype='application/json')
+
+
+def parseFields(value, allowed):
+    """Reads a `?fields=a,b` selection, all of `allowed` when empty
+
+    Raises ValueError naming the fields that are not in `allowed`.
+    """
+    if not value:
+        return tuple(allowed)
+    fields = tuple(dict.fromkeys(
+        field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in allowed]
+    if unknown or not fields:
+        raise ValueError('Unknown fields: %s' % ', '.join(unknown or [value]))
+    return fields
@@ -0,0 +1,617 @@
+import os
+import re
+import json
+import app as fyyur
+import time
+import tempfile
+import unittest
+import datetime
+from sqlalchemy.exc import IntegrityError
+
+from app import app, db, State, City, Venue, Artist, Show, Genres, \
+    getVenuesByArea, getShowTimeline, getKeysetPage, getOrInsertState, \
+    getOrInsertCity, getOrInsertGenres, referenceCache, pageCache, \
+    purgeListing, VenueGenres, generateData, rollShowCounters
+from search import searchByName
+from generator import DataGenerator
+from benchmark import QueryCounter, routeCases, benchmarkDatetimeFilter, \
+    listingForm, main as benchmark
+from sqlalchemy import event
+from instrumentation import QueryBudgetExceeded
+from pooling import MeteredQueuePool, poolStats
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine.url import make_url
+
+
+class StatementRecorder(object):
+    """Records the statements sent to the engine while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+
+LARGE_TABLES = ('shows', 'venues', 'artists', 'venue_genres', 'artist_genres')
+
+
+def sequentialScans(connection, statement, parameters):
+    """Large tables the plan of `statement` reads without an index"""
+    if connection.dialect.name == 'postgresql':
+        plan = connection.exec_driver_sql(
+            'EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+        nodes, scans = [plan[0]['Plan']], []
+        while nodes:
+            node = nodes.pop()
+            nodes.extend(node.get('Plans', []))
+            if node['Node Type'] == 'Seq Scan' and node['Relation Name'] in LARGE_TABLES:
+                scans.append(node['Relation Name'])
+        return scans
+    plan = connection.exec_driver_sql(
+        'EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    return [match.group(1) for match in (
+        re.match(r'SCAN (?:TABLE )?(\w+)$', row[-1]) for row in plan)
+        if match and match.group(1) in LARGE_TABLES]
+
+
+class FyyurTestCase(unittest.TestCase):
+    """This class represents the fyyur test case"""
+
+    def setUp(self):
+        """Define test variables and initialize app."""
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        app.config['TESTING'] = True
+        self.client = app.test_client
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.drop_all()
+        db.create_all()
+        referenceCache.invalidate()
+        pageCache.invalidate()
+
+    def tearDown(self):
+        """Executed after reach test"""
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def seed(self, venues, shows_per_venue=3):
+        state = getOrInsertState('CA')
+        cities = [getOrInsertCity('City %s' % i, state) for i in range(5)]
+        artist = Artist(name='Artist', city=cities[0])
+        now = datetime.datetime.now()
+        for i in range(venues):
+            venue = Venue(name='Venue %s' % i, city=cities[i % len(cities)])
+            for days in range(shows_per_venue):
+                db.session.add(Show(
+                    venue=venue, artist=artist,
+                    start_time=now + datetime.timedelta(days=days - 1, hours=1)))
+        db.session.commit()
+
+    def test_venues_by_area(self):
+        """Test the grouped venues listing"""
+        self.seed(10)
+        areas = getVenuesByArea()
+        self.assertEqual(len(areas), 5)
+        self.assertEqual(areas[0]['state'], 'CA')
+        self.assertEqual(sum(len(area['venues']) for area in areas), 10)
+        for area in areas:
+            for venue in area['venues']:
+                self.assertEqual(venue['upcoming_shows_count'], 2)
+
+    def test_get_venues(self):
+        self.seed(3)
+        res = self.client().get('/venues')
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'Venue 2', res.data)
+
+    def test_venues_query_count_is_flat(self):
+        """Benchmark: /venues query count must not grow with venues"""
+        self.seed(5)
+        with QueryCounter(db.engine) as small:
+            self.client().get('/venues').get_data()
+
+        self.seed(200)
+        with QueryCounter(db.engine) as large:
+            self.client().get('/venues').get_data()
+
+        self.assertEqual(small.count, large.count)
+        self.assertLessEqual(large.count, 2)
+
+    def test_show_timeline(self):
+        """Test upcoming and past shows are partitioned and limited"""
+        self.seed(1, shows_per_venue=6)
+        venue = Venue.query.first()
+        timeline = getShowTimeline(Venue, venue.id, limit=2)
+        self.assertEqual(timeline['upcoming_shows_count'], 5)
+        self.assertEqual(timeline['past_shows_count'], 1)
+        self.assertEqual(len(timeline['upcoming_shows']), 2)
+        self.assertEqual(timeline['upcoming_shows'][0]['artist_name'], 'Artist')
+        upcoming = [show['start_time'] for show in timeline['upcoming_shows']]
+        self.assertEqual(upcoming, sorted(upcoming))
+
+        artist = Artist.query.first()
+        timeline = getShowTimeline(Artist, artist.id)
+        self.assertEqual(timeline['upcoming_shows_count'], 5)
+        self.assertEqual(timeline['past_shows'][0]['venue_name'], 'Venue 0')
+
+    def test_get_venue_and_artist(self):
+        self.seed(1)
+        res = self.client().get('/venues/%s' % Venue.query.first().id)
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'2 Upcoming Shows', res.data)
+        res = self.client().get('/artists/%s' % Artist.query.first().id)
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'1 Past Show', res.data)
+
+    def test_keyset_pages_cover_all_rows(self):
+        """Test keyset pages are stable and do not overlap"""
+        self.seed(4, shows_per_venue=5)
+        seen = []
+        cursor = None
+        while True:
+            rows, cursor = getKeysetPage(
+                db.session.query(Show.id, Show.start_time),
+                (Show.start_time, Show.id), cursor, limit=3)
+            seen.extend(row.id for row in rows)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 20)
+        self.assertEqual(len(set(seen)), 20)
+
+    def test_keyset_page_seeks_to_cursor(self):
+        """Test a page after a cursor starts from the cursor in the index"""
+        db.session.add_all([Artist(name='Artist %03d' % i) for i in range(30)])
+        db.session.commit()
+        res = self.client().get('/artists?limit=10')
+        cursor = re.search(r'after=([\w=-]+)', res.data.decode()).group(1)
+        with StatementRecorder(db.engine) as recorder:
+            res = self.client().get('/artists?limit=10&after=%s' % cursor)
+        self.assertIn(b'Artist 010', res.data)
+        self.assertNotIn(b'Artist 009', res.data)
+        statement, parameters = [
+            (statement, parameters) for statement, parameters in
+            recorder.statements if 'FROM artists' in statement][0]
+        plan = db.session.connection().exec_driver_sql(
+            'EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+        self.assertTrue(any(row[-1].startswith('SEARCH artists')
+                            for row in plan), plan)
+
+    def test_get_paginated_shows_and_artists(self):
+        self.seed(5)
+        res = self.client().get('/shows?limit=2')
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'Next page', res.data)
+        res = self.client().get('/artists')
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn(b'Next page', res.data)
+
+    def test_400_invalid_cursor(self):
+        res = self.client().get('/shows?after=invalid')
+        self.assertEqual(res.status_code, 400)
+
+    def test_search_artists(self):
+        """Test search matches word prefixes and keeps index in sync"""
+        self.seed(1)
+        db.session.add(Artist(name='The Wild Sax Band'))
+        db.session.add(Artist(name='Guns N Petals'))
+        db.session.commit()
+        result = searchByName(db.session, Artist, 'wi sa')
+        self.assertEqual(result['count'], 1)
+        self.assertEqual(result['data'][0].name, 'The Wild Sax Band')
+
+        artist = Artist.query.filter(Artist.name == 'Guns N Petals').first()
+        artist.name = 'Roses'
+        db.session.commit()
+        self.assertEqual(searchByName(db.session, Artist, 'Petals')['count'], 0)
+        self.assertEqual(searchByName(db.session, Artist, 'ros')['count'], 1)
+        self.assertEqual(searchByName(db.session, Artist, '')['count'], 3)
+
+    def test_search_venues_page(self):
+        self.seed(3)
+        res = self.client().post('/venues/search', data={'search_term': 'Venue'})
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'"Venue": 3', res.data)
+
+    def test_streamed_pages(self):
+        """Test listing and search pages stream and show flashes once"""
+        self.seed(3)
+        with self.client() as client:
+            with client.session_transaction() as session:
+                session['_flashes'] = [('message', 'Listed!')]
+            res = client.get('/venues')
+            self.assertTrue(res.is_streamed)
+            self.assertIn(b'Listed!', res.data)
+            self.assertIn(b'Venue 2', res.data)
+            self.assertNotIn(b'Listed!', client.get('/artists').data)
+
+        res = self.client().post('/venues/search', data={'search_term': 'venue'})
+        self.assertTrue(res.is_streamed)
+        self.assertIn(b'search results for "venue": 3', res.data)
+        self.assertEqual(res.data.count(b'<h5>Venue'), 3)
+
+    def test_search_benchmark(self):
+        """Benchmark: indexed search stays under 50ms
+
+        Set SEARCH_BENCHMARK_ROWS=1000000 for the full-size run.
+        """
+        rows = int(os.environ.get('SEARCH_BENCHMARK_ROWS', 20000))
+        db.session.execute(Artist.__table__.insert(), [
+            {'name': 'Artist %s band %s' % (i, i % 997)} for i in range(rows)])
+        db.session.commit()
+        start = time.perf_counter()
+        result = searchByName(db.session, Artist, 'band 99')
+        elapsed = time.perf_counter() - start
+        self.assertTrue(result['count'])
+        self.assertLess(elapsed, 0.05)
+
+    def test_datetime_filter_benchmark(self):
+        """Benchmark: the datetime filter is faster and formats the same"""
+        result = benchmarkDatetimeFilter(rows=2000)
+        self.assertTrue(result['identical'])
+        self.assertLess(result['current_ms'], result['legacy_ms'] / 2)
+        self.assertEqual(fyyur.format_datetime('2030-01-01 20:00:00', 'full'),
+                         "Tuesday January, 1, 2030 at 8:00PM")
+
+    def test_reference_cache(self):
+        """Test lookups are served from the cache after the first query"""
+        db.session.add(Genres(name='jazz'))
+        db.session.add(City(name='San Francisco', state=State(name='CA')))
+        db.session.commit()
+
+        state = getOrInsertState('CA')
+        getOrInsertCity('San Francisco', state)
+        getOrInsertGenres(['jazz', 'pop'])
+        db.session.close()
+
+        hits = referenceCache.hits
+        with QueryCounter(db.engine) as counter:
+            state = getOrInsertState('CA')
+            city = getOrInsertCity('San Francisco', state)
+            genres = getOrInsertGenres(['jazz'])
+        self.assertEqual(counter.count, 0)
+        self.assertEqual(city.state_id, state.id)
+        self.assertEqual(genres[0].name, 'jazz')
+        self.assertEqual(referenceCache.hits - hits, 3)
+
+        venue = Venue(name='Venue', city=city, genres=getOrInsertGenres(['jazz', 'pop']))
+        db.session.add(venue)
+        db.session.commit()
+        self.assertEqual(Genres.query.count(), 2)
+        self.assertEqual(referenceCache.stats()['entries'], 3)
+
+    def test_get_or_insert_does_not_duplicate(self):
+        """Test upserts reuse rows inserted behind the cache's back"""
+        state = getOrInsertState('CA')
+        city = getOrInsertCity('Oakland', state)
+        genres = getOrInsertGenres(['jazz', 'pop', 'jazz'])
+        db.session.commit()
+        referenceCache.invalidate()
+
+        self.assertEqual(getOrInsertState('CA').id, state.id)
+        self.assertEqual(getOrInsertCity('Oakland', state).id, city.id)
+        self.assertEqual([genre.id for genre in getOrInsertGenres(['pop', 'jazz'])],
+                         [genres[1].id, genres[0].id])
+        db.session.commit()
+        self.assertEqual(State.query.count(), 1)
+        self.assertEqual(City.query.count(), 1)
+        self.assertEqual(Genres.query.count(), 2)
+
+        db.session.add(Genres(name='jazz'))
+        with self.assertRaises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+    def test_create_venue(self):
+        res = self.client().post('/venues/create', data={
+            'name': 'The Musical Hop', 'city': 'San Francisco', 'state': 'CA',
+            'address': '1015 Folsom Street', 'phone': '123-123-1234',
+            'genres': ['Jazz', 'Folk'], 'facebook_link': ''})
+        self.assertEqual(res.status_code, 200)
+        venue = Venue.query.first()
+        self.assertEqual(venue.city.state.name, 'CA')
+        self.assertEqual(sorted(genre.name for genre in venue.genres), ['Folk', 'Jazz'])
+
+    def test_import_venues_and_shows(self):
+        """Test the import command streams files in chunks and resumes"""
+        directory = tempfile.mkdtemp()
+        venues = os.path.join(directory, 'venues.csv')
+        with open(venues, 'w') as file:
+            file.write('name,city,state,genres,seeking_talent\n')
+            for i in range(25):
+                file.write('Venue %s,City %s,CA,"Jazz,Folk",%s\n' % (i, i % 3, i % 2))
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['import', 'venues', venues, '--chunk-size', '10'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('25 records imported', result.output)
+        self.assertEqual(Venue.query.count(), 25)
+        self.assertEqual(City.query.count(), 3)
+        self.assertEqual(Genres.query.count(), 2)
+        self.assertEqual(len(Venue.query.get(3).genres), 2)
+        self.assertTrue(Venue.query.get(2).seeking_talent)
+
+        db.session.add(Artist(name='Artist'))
+        db.session.commit()
+        shows = os.path.join(directory, 'shows.jsonl')
+        records = [{'venue_id': 1, 'artist_id': 1, 'start_time': '2030-01-01T20:00:00'}
+                   for i in range(5)]
+        records[3]['start_time'] = 'not a date'
+        with open(shows, 'w') as file:
+            file.write('\n'.join(json.dumps(record) for record in records))
+        result = runner.invoke(args=['import', 'shows', shows, '--chunk-size', '2'])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn('Chunk starting at record 2 failed', result.output)
+        self.assertEqual(Show.query.count(), 2)
+
+        records[3]['start_time'] = '2030-01-02T20:00:00'
+        with open(shows, 'w') as file:
+            file.write('\n'.join(json.dumps(record) for record in records))
+        result = runner.invoke(args=['import', 'shows', shows, '--chunk-size', '2'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Resuming after 2', result.output)
+        self.assertEqual(Show.query.count(), 5)
+        self.assertFalse(os.path.exists(shows + '.progress'))
+
+    def test_generator_is_deterministic(self):
+        first = DataGenerator(seed=7, anchor=datetime.datetime(2030, 1, 1))
+        second = DataGenerator(seed=7, anchor=datetime.datetime(2030, 1, 1))
+        self.assertEqual(list(first.venues(20)), list(second.venues(20)))
+        self.assertEqual(list(first.shows(50, [1, 2, 3], [4, 5])),
+                         list(second.shows(50, [1, 2, 3], [4, 5])))
+
+    def test_benchmark_covers_every_route(self):
+        """Test the load-test harness runs and reports every route"""
+        output = os.path.join(tempfile.mkdtemp(), 'benchmark.json')
+        results = benchmark(['--database', 'sqlite://', '--venues', '10',
+                             '--artists', '10', '--shows', '50',
+                             '--iterations', '2', '--output', output])
+        self.assertEqual(results['uncovered'], [])
+        with open(output) as file:
+            routes = json.load(file)['routes']
+        self.assertEqual(routes['GET /venues']['queries_max'], 1)
+        for stats in routes.values():
+            self.assertTrue(set(stats['status']) <= {'200', '302'})
+
+    def test_server_timing_and_query_budget(self):
+        """Test requests report SQL timing and fail over budget"""
+        self.seed(2)
+        res = self.client().get('/venues')
+        timing = res.headers.getlist('Server-Timing')
+        self.assertIn('desc="1 queries"', timing[0])
+        self.assertIn(b'Venue 1', res.data)
+
+        budgets = app.config['SQL_QUERY_BUDGETS']
+        app.config['SQL_QUERY_BUDGETS'] = dict(budgets, venues=0)
+        try:
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client().get('/venues')
+        finally:
+            app.config['SQL_QUERY_BUDGETS'] = budgets
+
+    def test_pool_settings_and_metrics(self):
+        """Test server databases get the pool settings and report saturation"""
+        options = {}
+        app.config['DB_STATEMENT_TIMEOUT_MS'] = 5000
+        try:
+            db.apply_driver_hacks(
+                app, make_url('postgresql://localhost/fyyur'), options)
+        finally:
+            app.config['DB_STATEMENT_TIMEOUT_MS'] = 0
+        self.assertIs(options['poolclass'], MeteredQueuePool)
+        self.assertEqual(options['pool_size'], app.config['DB_POOL_SIZE'])
+        self.assertTrue(options['pool_pre_ping'])
+        self.assertEqual(options['connect_args']['options'], '-c statement_timeout=5000')
+
+        path = os.path.join(tempfile.mkdtemp(), 'pool.db')
+        engine = create_engine('sqlite:///' + path, poolclass=MeteredQueuePool,
+                               pool_size=1, max_overflow=1, pool_timeout=0.05)
+        first, second = engine.connect(), engine.connect()
+        with self.assertRaises(exc.TimeoutError):
+            engine.connect()
+        stats = poolStats(engine)
+        self.assertEqual((stats['checked_out'], stats['saturation']), (2, 1.0))
+        self.assertEqual((stats['checkouts'], stats['checkout_timeouts']), (2, 1))
+        self.assertGreaterEqual(stats['checkout_wait_max_ms'], 50)
+        first.close()
+        second.close()
+        engine.dispose()
+
+        res = self.client().get('/metrics/pool')
+        self.assertEqual(json.loads(res.data)['pool'], 'StaticPool')
+
+    def test_read_replica_routing(self):
+        """Test read-only views use the replica unless the client just wrote"""
+        directory = tempfile.mkdtemp()
+        primary = 'sqlite:///' + os.path.join(directory, 'primary.db')
+        replica = 'sqlite:///' + os.path.join(directory, 'replica.db')
+        app.config['SQLALCHEMY_DATABASE_URI'] = primary
+        app.config['SQLALCHEMY_REPLICA_URIS'] = [replica]
+        try:
+            db.create_all()
+            db.Model.metadata.create_all(db.get_replica(app, replica))
+            db.session.execute(Artist.__table__.insert(), {'name': 'Primary Artist'})
+            db.session.commit()
+            with db.get_replica(app, replica).begin() as connection:
+                connection.execute(Artist.__table__.insert(), {'name': 'Replica Artist'})
+
+            def names(client):
+                res = client.get('/api/v1/artists?fields=name')
+                return [artist['name'] for artist in json.loads(res.data)['data']]
+
+            client = self.client()
+            self.assertEqual(names(client), ['Replica Artist'])
+            form = listingForm(next(DataGenerator(0).artists(1)))
+            res = client.post('/artists/create', data=form)
+            self.assertIn('db_write_at=', res.headers['Set-Cookie'])
+            self.assertEqual(names(client), sorted(['Primary Artist', form['name']]))
+            self.assertEqual(names(self.client()), ['Replica Artist'])
+        finally:
+            app.config['SQLALCHEMY_REPLICA_URIS'] = []
+
+    def test_cached_detail_pages(self):
+        """Test detail pages are cached, revalidated and invalidated"""
+        self.seed(1)
+        venue_id = Venue.query.first().id
+        artist_id = Artist.query.first().id
+        url = '/venues/%s' % venue_id
+        first = self.client().get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.headers['ETag'])
+
+        with QueryCounter(db.engine) as counter:
+            second = self.client().get(url)
+        self.assertEqual(counter.count, 0)
+        self.assertEqual(second.data, first.data)
+
+        res = self.client().get(url, headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+
+        self.client().post('/shows/create', data={
+            'venue_id': venue_id, 'artist_id': artist_id,
+            'start_time': '2099-01-01 20:00:00'})
+        res = self.client().get(url, headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'3 Upcoming Shows', res.data)
+
+        self.client().get('/artists/%s' % artist_id)
+        self.client().post('/venues/%s/edit' % venue_id, data={
+            'name': 'Renamed Venue', 'city': 'City 0', 'state': 'CA'})
+        res = self.client().get('/artists/%s' % artist_id)
+        self.assertIn(b'Renamed Venue', res.data)
+
+    def test_delete_venue_cascades(self):
+        """Test deleting a venue removes its shows and genre links"""
+        self.seed(2)
+        venue = Venue.query.first()
+        venue.genres = getOrInsertGenres(['Jazz'])
+        db.session.commit()
+        venue_id = venue.id
+        with QueryCounter(db.engine) as counter:
+            res = self.client().delete('/venues/%s' % venue_id)
+        self.assertEqual(res.status_code, 200)
+        self.assertLessEqual(counter.count, 3)
+        self.assertIsNone(Venue.query.get(venue_id))
+        self.assertEqual(Show.query.filter(Show.venue_id == venue_id).count(), 0)
+        self.assertEqual(Show.query.count(), 3)
+        self.assertEqual(db.session.query(VenueGenres).count(), 0)
+
+        res = self.client().delete('/venues/%s' % venue_id)
+        self.assertEqual(res.status_code, 404)
+
+    def test_delete_artist_in_background(self):
+        """Test background mode hides the artist and purges it later"""
+        self.seed(3)
+        artist_id = Artist.query.first().id
+        submitted = []
+
+        class Executor(object):
+            def submit(self, *args):
+                submitted.append(args)
+
+        executor, fyyur.purgeExecutor = fyyur.purgeExecutor, Executor()
+        app.config['DELETE_MODE'] = 'background'
+        try:
+            with QueryCounter(db.engine) as counter:
+                res = self.client().delete('/artists/%s' % artist_id)
+        finally:
+            app.config['DELETE_MODE'] = 'cascade'
+            fyyur.purgeExecutor = executor
+        self.assertEqual(res.status_code, 200)
+        # only the UPDATE marking it deleted, its shows are left to the purge
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(submitted, [(fyyur.purgeInBackground, Artist, artist_id)])
+        self.assertEqual(self.client().get('/artists/%s' % artist_id).status_code, 404)
+        self.assertNotIn(b'<h5>Artist</h5>', self.client().get('/artists').data)
+        self.assertEqual(Show.query.count(), 9)
+
+        purgeListing(Artist, artist_id, batch_size=4)
+        self.assertEqual(Show.query.count(), 0)
+        self.assertIsNone(Artist.query.get(artist_id))
+
+    def test_show_counters(self):
+        """Test the precomputed counters follow inserts, deletes and time"""
+        self.seed(2)
+        artist = Artist.query.first()
+        venue_ids = [id for id, in db.session.query(Venue.id).order_by(Venue.id)]
+        self.assertEqual((artist.upcoming_shows_count, artist.past_shows_count), (4, 2))
+
+        res = self.client().post('/shows/create', data={
+            'venue_id': venue_ids[0], 'artist_id': artist.id,
+            'start_time': '2000-01-01 20:00:00'})
+        self.assertEqual(res.status_code, 200)
+        venue = Venue.query.get(venue_ids[0])
+        self.assertEqual((venue.upcoming_shows_count, venue.past_shows_count), (2, 2))
+
+        self.client().delete('/venues/%s' % venue_ids[1])
+        artist = Artist.query.first()
+        self.assertEqual((artist.upcoming_shows_count, artist.past_shows_count), (2, 2))
+
+        rollShowCounters()
+        rolled = rollShowCounters(
+            datetime.datetime.now() + datetime.timedelta(days=1, hours=2))
+        self.assertEqual(rolled, ([venue_ids[0]], [artist.id]))
+        venue = Venue.query.get(venue_ids[0])
+        self.assertEqual((venue.upcoming_shows_count, venue.past_shows_count), (0, 4))
+
+    def test_json_api(self):
+        """Test the API pages, selects fields and reports errors as JSON"""
+        self.seed(3)
+        res = self.client().get('/api/v1/venues?limit=2&fields=id,name,upcoming_shows_count')
+        self.assertEqual(res.status_code, 200)
+        page = json.loads(res.data)
+        self.assertEqual([sorted(item) for item in page['data']],
+                         [['id', 'name', 'upcoming_shows_count']] * 2)
+        self.assertEqual(page['data'][0]['upcoming_shows_count'], 2)
+        res = self.client().get('/api/v1/venues?limit=2&after=%s' % page['next'])
+        self.assertEqual(json.loads(res.data)['data'][0]['city'], 'City 2')
+
+        venue_id = page['data'][0]['id']
+        res = self.client().get('/api/v1/venues/%s' % venue_id)
+        venue = json.loads(res.data)['data']
+        self.assertEqual((venue['state'], len(venue['upcoming_shows'])), ('CA', 2))
+        res = self.client().get('/api/v1/shows?fields=artist_name')
+        self.assertEqual(json.loads(res.data)['data'][0], {'artist_name': 'Artist'})
+        res = self.client().get('/api/v1/artists/search?q=art&fields=id,past_shows_count')
+        self.assertEqual(json.loads(res.data)['data'][0]['past_shows_count'], 3)
+
+        res = self.client().get('/api/v1/venues?fields=id,password')
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(json.loads(res.data)['message'], 'Unknown fields: password')
+        res = self.client().get('/api/v1/artists/1000')
+        self.assertEqual(json.loads(res.data)['error'], 404)
+
+    def test_routes_use_indexes(self):
+        """Test no route query falls back to a sequential scan"""
+        generator = generateData(seed=1, venues=300, artists=300, shows=3000)
+        venue_ids = [id for id, in db.session.query(Venue.id)]
+        artist_ids = [id for id, in db.session.query(Artist.id)]
+        db.session.remove()
+        connection = db.engine.connect()
+        for method, rule, request in routeCases(generator, venue_ids, artist_ids):
+            url, form = request(0)
+            pageCache.invalidate()
+            with StatementRecorder(db.engine) as recorder:
+                self.client().open(url, method=method, data=form).get_data()
+            for statement, parameters in recorder.statements:
+                if statement.lstrip().upper().startswith(('INSERT', 'PRAGMA')):
+                    continue
+                self.assertEqual(
+                    sequentialScans(connection, statement, parameters), [],
+                    '%s %s: %s' % (method, rule, statement))
+        connection.close()
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
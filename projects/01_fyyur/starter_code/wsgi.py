@@ -0,0 +1,17 @@
+#----------------------------------------------------------------------------#
+# Cooperative server entry point.
+#
+# Patches the standard library and psycopg2 for gevent before the app is
+# imported, so one worker serves many requests and overlaps their database
+# waits instead of blocking a thread per request:
+#
+#   gunicorn -k gevent --worker-connections 200 wsgi:app
+#----------------------------------------------------------------------------#
+
+from gevent import monkey
+monkey.patch_all()
+
+from psycogreen.gevent import patch_psycopg
+patch_psycopg()
+
+from app import app
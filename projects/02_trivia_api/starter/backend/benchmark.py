@@ -0,0 +1,142 @@
+'''
+Quiz benchmark
+
+Seeds a database with n questions for each size and times POST /quizzes
+against the handler it replaced, which loaded and formatted every question
+of the category, writing the results as JSON:
+
+    python benchmark.py --sizes 10000 100000 1000000 --output quiz.json
+'''
+
+import os
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+
+CATEGORIES = 6
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1,
+                       int(round(fraction * (len(ordered) - 1))))]
+
+
+def legacy_play(Question, category_id, previous_questions):
+    '''
+    the /quizzes handler before it sampled from the question index
+    '''
+    questions = Question.query.filter(
+        Question.category == category_id).all() if category_id \
+        else Question.query.all()
+    filtered = [question.format() for question in questions]
+    unseen = [question for question in filtered
+              if question['id'] not in previous_questions]
+    return random.choice(unseen) if unseen else None
+
+
+def seed(db, Question, Category, size):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(Category.__table__.insert(), [
+        {'type': 'Category %s' % i} for i in range(CATEGORIES)])
+    for start in range(0, size, 50000):
+        db.session.execute(Question.__table__.insert(), [
+            {'question': 'Question %s?' % i, 'answer': 'Answer %s' % i,
+             'category': str(i % CATEGORIES + 1), 'difficulty': i % 5 + 1}
+            for i in range(start, min(size, start + 50000))])
+    db.session.commit()
+
+
+def time_requests(play, requests):
+    timings = []
+    for i in range(requests):
+        start = time.perf_counter()
+        play(i)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'requests': requests,
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3)
+    }
+
+
+def run_size(app, size, requests, legacy_requests, previous):
+    from flaskr import question_index
+    from models import db, Question, Category
+
+    with app.app_context():
+        seed(db, Question, Category, size)
+        # a quiz part way through: the ids it has already been asked
+        seen = random.sample(range(1, size + 1), min(previous, size))
+    client = app.test_client()
+
+    def play(i):
+        category = i % (CATEGORIES + 1)
+        response = client.post('/quizzes', json={
+            'previous_questions': seen,
+            'quiz_category': {'id': category}
+        })
+        assert response.status_code == 200, response.status_code
+
+    question_index.clear()
+    start = time.perf_counter()
+    play(0)
+    result = {
+        'questions': size,
+        'first_request_ms': round((time.perf_counter() - start) * 1000, 3),
+        'current': time_requests(play, requests)
+    }
+
+    if legacy_requests:
+        def play_legacy(i):
+            with app.app_context():
+                legacy_play(Question, i % (CATEGORIES + 1), seen)
+
+        result['legacy'] = time_requests(play_legacy, legacy_requests)
+        result['speedup'] = round(
+            result['legacy']['p50_ms'] / result['current']['p50_ms'], 1)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database', default='sqlite:///' + os.path.join(
+        tempfile.gettempdir(), 'trivia-benchmark.db'))
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--legacy-requests', type=int, default=5,
+                        help='0 skips the legacy handler')
+    parser.add_argument('--previous', type=int, default=20,
+                        help='previous_questions sent with each request')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark.json')
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    os.environ['DATABASE_URL'] = args.database
+    from flaskr import create_app
+    app = create_app()
+    app.logger.setLevel(logging.WARNING)
+
+    results = [run_size(app, size, args.requests, args.legacy_requests,
+                        args.previous) for size in args.sizes]
+    with open(args.output, 'w') as output:
+        json.dump({'sizes': results}, output, indent=2)
+    for result in results:
+        print('%(questions)9d questions: %(p50)8.3f ms p50, first request '
+              '%(first)8.3f ms, legacy %(legacy)s' % {
+                  'questions': result['questions'],
+                  'p50': result['current']['p50_ms'],
+                  'first': result['first_request_ms'],
+                  'legacy': '%.3f ms p50' % result['legacy']['p50_ms']
+                  if 'legacy' in result else 'skipped'})
+
+
+if __name__ == '__main__':
+    main()
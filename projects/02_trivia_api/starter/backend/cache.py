@@ -0,0 +1,268 @@
+import abc
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from array import array
+from flask import current_app
+from sqlalchemy import event, inspect
+
+from routing import primary
+
+
+'''
+ModelCache
+    a value built from a model's table, loaded once per process
+    ORM inserts, updates and deletes of the model invalidate it; bulk
+    writes that bypass the ORM must call invalidate()
+    with a ttl, entries also expire so other workers pick up changes
+    values are loaded from the primary, a lagging replica would keep them
+    stale until the ttl
+'''
+
+
+class ModelCache(metaclass=abc.ABCMeta):
+
+    def __init__(self, model, ttl=None):
+        self.model = model
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entry = None
+        self.generation = 0
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(model, name, getattr(self, '_' + name[6:]))
+
+    def _insert(self, mapper, connection, target):
+        self.invalidate()
+
+    def _update(self, mapper, connection, target):
+        self.invalidate()
+
+    def _delete(self, mapper, connection, target):
+        self.invalidate()
+
+    def invalidate(self):
+        self.clear()
+
+    def clear(self):
+        '''
+        drops the value, the next call loads it again
+        '''
+        with self.lock:
+            self.entry = None
+            self.generation += 1
+
+    @abc.abstractmethod
+    def build(self):
+        '''
+        the value, read from the model's table
+        '''
+
+    def _load(self):
+        with self.lock:
+            entry, generation = self.entry, self.generation
+        if entry is not None and (
+                self.ttl is None or time.monotonic() < entry[0]):
+            return entry[1]
+
+        with primary():
+            value = self.build()
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            # keep it only if nothing changed while it was loading
+            if generation == self.generation:
+                self.entry = (expires, value)
+        return value
+
+
+'''
+CategoryCache
+    the {id: type} category map and its JSON
+'''
+
+
+class CategoryCache(ModelCache):
+
+    def build(self):
+        categories = {category.id: category.type for category in
+                      self.model.query.order_by(self.model.id)}
+        return categories, json.dumps(categories)
+
+    def get(self):
+        '''
+        the {id: type} map; callers must not modify it
+        '''
+        return self._load()[0]
+
+    def fragment(self):
+        '''
+        the same map serialized once, to splice into responses
+        '''
+        return self._load()[1]
+
+    def __contains__(self, category_id):
+        try:
+            return int(category_id) in self.get()
+        except (TypeError, ValueError):
+            return False
+
+
+'''
+QuestionIndex
+    the question ids of each category, so a quiz draws a random unseen
+    question without reading the questions table
+    inserts, deletes and category changes are applied in place instead of
+    reloading it; ids of questions deleted by other workers may linger
+    until the ttl, callers skip the ones they can no longer load
+    once loaded, an expired or invalidated index keeps being served while
+    its refresher thread rebuilds it; only the first load blocks
+    questions created or deleted by other workers are therefore missing
+    from, or linger in, this worker's index for up to the ttl
+    (QUESTION_INDEX_TTL, an hour by default) plus one rebuild
+'''
+
+
+class QuestionIndex(ModelCache):
+
+    # rejection sampling tries before falling back to listing the unseen ids
+    attempts = 16
+
+    def __init__(self, model, ttl=None):
+        super(QuestionIndex, self).__init__(model, ttl)
+        self.stale = False
+        self.refreshing = False
+        # one thread per index, started on the first refresh
+        self.refresher = ThreadPoolExecutor(max_workers=1)
+
+    def build(self):
+        pools = {}
+        rows = self.model.query.with_entities(
+            self.model.category, self.model.id).yield_per(10000)
+        for category, question_id in rows:
+            pool = pools.get(str(category))
+            if pool is None:
+                pool = pools[str(category)] = array('l')
+            pool.append(question_id)
+        return pools
+
+    def _insert(self, mapper, connection, target):
+        with self.lock:
+            self.generation += 1
+            if self.entry is not None:
+                pools = self.entry[1]
+                pools.setdefault(str(target.category), array('l')).append(
+                    target.id)
+
+    def _update(self, mapper, connection, target):
+        history = inspect(target).attrs.category.history
+        if not history.deleted or \
+                str(history.deleted[0]) == str(target.category):
+            return
+        with self.lock:
+            self.generation += 1
+            if self.entry is not None:
+                pools = self.entry[1]
+                pool = pools.get(str(history.deleted[0]))
+                if pool and target.id in pool:
+                    pool.remove(target.id)
+                pools.setdefault(str(target.category), array('l')).append(
+                    target.id)
+
+    def _delete(self, mapper, connection, target):
+        self.discard([(target.category, target.id)])
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.stale = True
+
+    def clear(self):
+        with self.lock:
+            self.entry = None
+            self.generation += 1
+            self.stale = False
+
+    def _load(self):
+        with self.lock:
+            entry = self.entry
+            if entry is not None and not self.refreshing and (
+                    self.stale or entry[0] is not None and
+                    time.monotonic() >= entry[0]):
+                self.refreshing = True
+                self.refresher.submit(
+                    self._refresh, current_app._get_current_object())
+        if entry is None:
+            return super(QuestionIndex, self)._load()
+        return entry[1]
+
+    def _refresh(self, app):
+        try:
+            with self.lock:
+                generation = self.generation
+            with app.app_context():
+                pools = self.build()
+            expires = time.monotonic() + self.ttl \
+                if self.ttl is not None else None
+            with self.lock:
+                # a write while it was loading keeps the old index, kept
+                # up to date in place, stale for the next call to retry
+                if generation == self.generation:
+                    self.entry = (expires, pools)
+                    self.stale = False
+        except Exception:
+            app.logger.exception('Rebuilding the question index failed')
+        finally:
+            with self.lock:
+                self.refreshing = False
+
+    def discard(self, questions):
+        '''
+        drops the (category, id) pairs of deleted questions
+        '''
+        removed = {}
+        for category, question_id in questions:
+            removed.setdefault(str(category), set()).add(question_id)
+        with self.lock:
+            self.generation += 1
+            if self.entry is None:
+                return
+            pools = self.entry[1]
+            # one pass over each pool, however many of its ids go
+            for category, question_ids in removed.items():
+                pool = pools.get(category)
+                if pool:
+                    pools[category] = array('l', (
+                        question_id for question_id in pool
+                        if question_id not in question_ids))
+
+    def sample(self, category=None, exclude=()):
+        '''
+        a random question id of the category, or of every category when
+        None, that is not in the set exclude; None once all are excluded
+        '''
+        pools = self._load()
+        with self.lock:
+            if category is None:
+                pools = [pool for pool in pools.values() if pool]
+            else:
+                pools = [pools.get(str(category)) or array('l')]
+            total = sum(len(pool) for pool in pools)
+
+            # with fewer than half the ids excluded a draw succeeds more
+            # often than not, so this takes a few tries whatever the size
+            if len(exclude) * 2 < total:
+                for attempt in range(self.attempts):
+                    position = random.randrange(total)
+                    for pool in pools:
+                        if position < len(pool):
+                            break
+                        position -= len(pool)
+                    if pool[position] not in exclude:
+                        return pool[position]
+
+            # otherwise the pools hold at most twice as many ids as the
+            # request excluded
+            unseen = [question_id for pool in pools for question_id in pool
+                      if question_id not in exclude]
+            return random.choice(unseen) if unseen else None
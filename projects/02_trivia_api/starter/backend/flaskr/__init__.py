@@ -1,56 +1,152 @@
+import io
 import os
-from flask import Flask, request, abort, jsonify
+import json
+import click
+from flask import Flask, request, abort, jsonify, Response
+from sqlalchemy import inspect
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-import random
 
-from models import setup_db, Question, Category
+from models import setup_db, db, Question, Category, question_total, \
+    question_counts, delete_questions, database_path
+from instrumentation import QueryInstrumentation
+from pooling import pool_stats, environ_setting
+from routing import read_only
+from cache import CategoryCache, QuestionIndex
+from search import search_page
+from ingest import ingest_questions, read_questions
 
 QUESTIONS_PER_PAGE = 10
+# ids a single DELETE /questions may remove
+MAX_DELETE_IDS = 1000
 
+category_cache = CategoryCache(Category)
+question_index = QuestionIndex(Question)
 
-def get_formated_category():
-    categories = Category.query.all()
-    formated_categories = {
-        category.id: category.type for category in categories}
-    return formated_categories
 
+def with_categories(payload, status=200):
+    '''
+    jsonify(payload) with the cached, already serialized category map
+    spliced in as its "categories" key
+    '''
+    members = ['%s: %s' % (json.dumps(key), json.dumps(value))
+               for key, value in payload.items() if key != 'categories']
+    members.append('"categories": %s' % category_cache.fragment())
+    body = '{%s}' % ', '.join(members)
+    return Response(body, status=status, mimetype='application/json')
 
-def get_formated_question(page, searchTerm=''):
-    questions = Question.query
+
+def lean_response():
+    '''
+    whether a write asked for just the ids it wrote rather than a listing,
+    with a Prefer: return=minimal header or ?lean=true
+    '''
+    prefer = request.headers.get('Prefer', '').replace(' ', '').lower()
+    return 'return=minimal' in prefer.split(',') or \
+        request.args.get('lean', 'false').lower() in ('1', 'true')
+
+
+def minimal(payload, status=200):
+    response = jsonify(payload)
+    response.status_code = status
+    response.headers['Preference-Applied'] = 'return=minimal'
+    return response
+
+
+def get_formated_question(page, searchTerm='', after=None):
     if searchTerm:
-        questions = questions.filter(
-            Question.question.ilike('%' + searchTerm + '%'))
-    questions = questions.paginate(page, 10)
-    formated_question = [question.format() for question in questions.items]
-    total_questions = questions.total
+        if page < 1:
+            abort(404)
+        # one ranked, indexed query for the page and the total
+        questions, total_questions = search_page(
+            db.session, Question, searchTerm, page, QUESTIONS_PER_PAGE)
+        if not questions and page != 1:
+            abort(404)
+        return {
+            'questions': [question.format() for question in questions],
+            'total_questions': total_questions
+        }
     return {
-        'questions': formated_question,
-        'total_questions': total_questions
+        **paginate_questions(Question.query, page, after),
+        'total_questions': question_total()
     }
 
 
-def get_formated_question_by_category(page, categoy_id):
-    questions = Question.query.filter(
-        Question.category == categoy_id).paginate(page, 10)
-    formated_question = [question.format() for question in questions.items]
-    total_questions = questions.total
+def get_formated_question_by_category(page, categoy_id, after=None):
+    questions = Question.query.filter(Question.category == categoy_id)
+    return {
+        **paginate_questions(questions, page, after),
+        'total_questions': question_total(categoy_id)
+    }
 
+
+def paginate_questions(questions, page, after=None):
+    '''
+    a page of questions in id order: the one following the question id
+    after when it is given, which costs the same at any depth, otherwise
+    the page-th one
+    '''
+    questions = questions.order_by(Question.id)
+    if after is not None:
+        questions = questions.filter(Question.id > after) \
+            .limit(QUESTIONS_PER_PAGE).all()
+    else:
+        if page < 1:
+            abort(404)
+        questions = questions.limit(QUESTIONS_PER_PAGE) \
+            .offset((page - 1) * QUESTIONS_PER_PAGE).all()
+        if not questions and page != 1:
+            abort(404)
     return {
-        'questions': formated_question,
-        'total_questions': total_questions
+        'questions': [question.format() for question in questions],
+        'next_after': questions[-1].id
+        if len(questions) == QUESTIONS_PER_PAGE else None
     }
 
 
-def get_question_by_category(category_id):
-    return Question.query.filter(Question.category == category_id).all()
+def get_random_question(category_id, previous_questions):
+    '''
+    a random question of the category, or of any category when it is
+    falsy, whose id is not in previous_questions; None when none is left
+    '''
+    excluded = {
+        question['id'] if isinstance(question, dict) else int(question)
+        for question in previous_questions}
+    while True:
+        question_id = question_index.sample(category_id or None, excluded)
+        if question_id is None:
+            return None
+        question = Question.query.get(question_id)
+        if question is not None:
+            return question.format()
+        # deleted since this worker loaded the index
+        excluded.add(question_id)
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
-    setup_db(app)
+    if test_config is not None:
+        app.config.update(test_config)
+    setup_db(app, app.config.get('SQLALCHEMY_DATABASE_URI', database_path))
     CORS(app)
+    # None keeps the categories until a write in this process invalidates
+    # them; with several workers a TTL bounds how stale the others get
+    category_cache.ttl = app.config.setdefault(
+        'CATEGORY_CACHE_TTL', environ_setting('CATEGORY_CACHE_TTL', int, 300))
+    category_cache.clear()
+    question_index.ttl = app.config.setdefault(
+        'QUESTION_INDEX_TTL', environ_setting('QUESTION_INDEX_TTL', int, 3600))
+    question_index.clear()
+    QueryInstrumentation(app, budgets={
+        'all_categories': 2,
+        'questions_by_category': 3,
+        'get_question': 3,
+        'post_question': 5,
+        'delete_question': 3,
+        'delete_questions_batch': 4,
+        'play': 2
+    })
 
     @app.after_request
     def after_request(response):
@@ -60,80 +156,94 @@ def create_app(test_config=None):
         return response
 
     @app.route('/categories')
+    @read_only
     def all_categories():
-        return jsonify({
-            'success': True,
-            'categories': get_formated_category()
-        })
+        payload = {'success': True}
+        # ?counts=true adds the question count and difficulty histogram
+        # of each category, so a menu needs a single request
+        if request.args.get('counts', 'false').lower() in ('1', 'true'):
+            payload['counts'] = question_counts()
+        return with_categories(payload)
 
     @app.route('/categories/<int:categoy_id>/questions')
+    @read_only
     def questions_by_category(categoy_id):
-        category = Category.query.get(categoy_id)
-        if not category:
+        if categoy_id not in category_cache:
             abort(404)
         else:
             page = request.args.get('page', 1, type=int)
+            after = request.args.get('after', type=int)
             returnedObj = {
                 'success': True,
                 'current_category': categoy_id,
-                'categories': get_formated_category(),
-                **get_formated_question_by_category(page, categoy_id)
+                **get_formated_question_by_category(page, categoy_id, after)
             }
-            return jsonify(returnedObj)
+            return with_categories(returnedObj)
 
-    @app.route('/questions', methods=['GET', 'POST'])
+    @app.route('/questions')
+    @read_only
     def get_question():
-        extraInfo = {}
-        formated_question = []
-        total_questions = 0
         page = request.args.get('page', 1, type=int)
-        if request.method == 'POST':
-            body = request.get_json()
-            searchTerm = body.get('searchTerm')
+        return with_categories({
+            'success': True,
+            'current_category': None,
+            **get_formated_question(
+                page, after=request.args.get('after', type=int))
+        }, 200)
 
-            if searchTerm is not None:
-                return jsonify({
-                    'success': True,
-                    **get_formated_question(page, searchTerm),
-                    'current_category': None,
-                    'categories': get_formated_category(),
-                }), 200
-            else:
-                question = body.get('question', None)
-                ansewer = body.get('ansewer', None)
-                category = body.get('category', None)
-                difficulty = body.get('difficulty', None)
+    def searching():
+        body = request.get_json(silent=True)
+        return isinstance(body, dict) and body.get('searchTerm') is not None
 
-                if not category or not Category.query.get(category):
-                    abort(422)
-                else:
-                    try:
-                        question = Question(
-                            question=question,
-                            answer=ansewer,
-                            category=category,
-                            difficulty=difficulty
-                        )
-                        question.insert()
-
-                        return jsonify({
+    # creating reads the categories from the primary, only searches may be
+    # served by a replica
+    @app.route('/questions', methods=['POST'])
+    @read_only(when=searching)
+    def post_question():
+        page = request.args.get('page', 1, type=int)
+        body = request.get_json()
+        searchTerm = body.get('searchTerm')
+
+        if searchTerm is not None:
+            return with_categories({
+                'success': True,
+                **get_formated_question(page, searchTerm),
+                'current_category': None
+            }, 200)
+        else:
+            question = body.get('question', None)
+            ansewer = body.get('ansewer', None)
+            category = body.get('category', None)
+            difficulty = body.get('difficulty', None)
+
+            if not category or category not in category_cache:
+                abort(422)
+            else:
+                try:
+                    question = Question(
+                        question=question,
+                        answer=ansewer,
+                        category=category,
+                        difficulty=difficulty
+                    )
+                    question.insert()
+                    # the id without reloading the expired question
+                    created = inspect(question).identity[0]
+                    if lean_response():
+                        return minimal({
                             'success': True,
-                            **get_formated_question(page),
-                            'current_category': None,
-                            'categories': get_formated_category(),
-                            'created': question.id
-                        }), 201
+                            'created': created
+                        }, 201)
 
-                    except Exception:
-                        abort(422)
+                    return with_categories({
+                        'success': True,
+                        **get_formated_question(page),
+                        'current_category': None,
+                        'created': created
+                    }, 201)
 
-        elif request.method == 'GET':
-            return jsonify({
-                'success': True,
-                'current_category': None,
-                'categories': get_formated_category(),
-                **get_formated_question(page)
-            }), 200
+                except Exception:
+                    abort(422)
 
     @app.route('/questions/<int:question_id>', methods=['DELETE'])
     def delete_question(question_id):
@@ -143,33 +253,81 @@ def create_app(test_config=None):
         else:
             try:
                 question.delete()
-                return jsonify({
+                payload = {
                     'success': True,
                     'id': question_id
-                })
+                }
+                # already minimal
+                return minimal(payload) if lean_response() \
+                    else jsonify(payload)
             except Exception:
                 abort(422)
 
+    @app.route('/questions', methods=['DELETE'])
+    def delete_questions_batch():
+        '''
+        deletes the questions of a JSON body {"ids": [...]} in one statement
+        '''
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            abort(422)
+        ids = body.get('ids')
+        if not isinstance(ids, list) or not ids or \
+                len(ids) > MAX_DELETE_IDS:
+            abort(422)
+        try:
+            ids = {int(question_id) for question_id in ids}
+        except (TypeError, ValueError):
+            abort(422)
+        deleted = delete_questions(ids)
+        if not deleted:
+            abort(404)
+        question_index.discard([
+            (category, question_id) for question_id, category in deleted])
+        payload = {
+            'success': True,
+            'deleted': sorted(question_id for question_id, _ in deleted)
+        }
+        if lean_response():
+            return minimal(payload)
+        return jsonify({
+            **payload,
+            'total_questions': question_total()
+        })
+
+    @app.route('/questions/bulk', methods=['POST'])
+    def bulk_questions():
+        '''
+        a JSON body {"questions": [...]}, or a JSON-lines or trivia.psql
+        upload read as it streams in
+        '''
+        if request.is_json:
+            body = request.get_json()
+            if not isinstance(body, dict):
+                abort(422)
+            questions = body.get('questions')
+            if not isinstance(questions, list):
+                abort(422)
+            records = enumerate(questions, 1)
+        else:
+            records = read_questions(
+                io.TextIOWrapper(request.stream, encoding='utf-8'))
+        report = import_question_records(
+            records, request.args.get('batch_size', 1000, type=int))
+        return jsonify({
+            'success': True,
+            **report
+        }), 201 if report['inserted'] else 200
+
     @app.route('/quizzes', methods=['POST'])
+    @read_only
     def play():
         try:
             body = request.get_json()
-            previousQuestions = body.get('previous_questions')
+            previousQuestions = body.get('previous_questions') or []
             quizCategory = body.get('quiz_category')
-            qId = quizCategory['id']
-            questions = get_question_by_category(
-                qId) if quizCategory['id'] else Question.query.all()
-            filteredQuestions = [question.format() for question in questions]
-            randomQuestion = None
-            if len(previousQuestions):
-                newlist = []
-                for question in filteredQuestions:
-                    if question['id'] not in previousQuestions:
-                        newlist.append(question)
-                if len(newlist):
-                    randomQuestion = random.choice(newlist)
-            else:
-                randomQuestion = random.choice(filteredQuestions)
+            randomQuestion = get_random_question(
+                quizCategory['id'], previousQuestions)
 
             return jsonify({
                 'success': True,
@@ -179,6 +337,13 @@ def create_app(test_config=None):
         except Exception:
             abort(422)
 
+    @app.route('/metrics/pool')
+    def pool_metrics():
+        return jsonify({
+            'success': True,
+            **pool_stats(db.engine)
+        })
+
     @app.errorhandler(422)
     def unprocessable(error):
         return jsonify({
@@ -195,4 +360,27 @@ def create_app(test_config=None):
             'message': "resource not found!"
         }), 404
 
+    @app.cli.command('import-questions')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--batch-size', default=1000, show_default=True,
+                  help='Questions inserted and committed per transaction.')
+    def import_questions(path, batch_size):
+        """Bulk imports questions from JSON-lines or a trivia.psql dump"""
+        with open(path, encoding='utf-8') as lines:
+            report = import_question_records(
+                read_questions(lines), batch_size, echo=click.echo)
+        click.echo('Imported %(inserted)s questions, rejected %(rejected)s '
+                   '(%(rows_per_second)s rows/sec)' % report)
+        for error in report['errors']:
+            click.echo('line %(line)s: %(error)s' % error, err=True)
+
     return app
+
+
+def import_question_records(records, batch_size=1000, echo=None):
+    categories = {str(category_id) for category_id in category_cache.get()}
+    try:
+        return ingest_questions(records, categories, batch_size, echo)
+    finally:
+        # the rows were inserted around the ORM
+        question_index.invalidate()
@@ -0,0 +1,162 @@
+import re
+import json
+import time
+import itertools
+from collections import Counter
+
+from models import db, Question, count_questions
+
+'''
+ingest
+    bulk loading of question packs, as JSON-lines or as the questions
+    COPY block of a pg_dump file like trivia.psql
+    rows are validated against the category ids in memory, inserted with
+    one executemany per batch and committed batch by batch; the question
+    counts are updated in the same transactions
+'''
+
+BATCH_SIZE = 1000
+# rejected rows reported back in detail, the rest are only counted
+MAX_ERRORS = 20
+
+COPY_START = re.compile(
+    r'^COPY\s+(?:\w+\.)?questions\s*\(([^)]*)\)\s+FROM\s+stdin', re.I)
+COPY_ESCAPES = {'t': '\t', 'n': '\n', 'r': '\r', 'b': '\b', 'f': '\f',
+                'v': '\v', '\\': '\\'}
+
+
+def read_json_lines(lines):
+    '''
+    (line number, object) for each non blank line, None when the line is
+    not valid JSON
+    '''
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+def copy_value(value):
+    if value == '\\N':
+        return None
+    return re.sub(r'\\(.)', lambda match: COPY_ESCAPES.get(
+        match.group(1), match.group(1)), value)
+
+
+def read_psql(lines):
+    '''
+    (line number, {column: value}) for each row of the questions COPY
+    block, other statements of the dump are skipped
+    '''
+    columns = None
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip('\r\n')
+        if columns is None:
+            match = COPY_START.match(line)
+            if match:
+                columns = [name.strip() for name in match.group(1).split(',')]
+        elif line == '\\.':
+            columns = None
+        else:
+            yield number, dict(zip(columns, map(copy_value, line.split('\t'))))
+
+
+def read_questions(lines):
+    '''
+    the records of a JSON-lines or pg_dump file, told apart by the first
+    line that isn't blank or a comment
+    '''
+    lines = iter(lines)
+    head = []
+    for line in lines:
+        head.append(line)
+        if line.strip() and not line.startswith('--'):
+            break
+    lines = itertools.chain(head, lines)
+    if head and head[-1].lstrip().startswith('{'):
+        return read_json_lines(lines)
+    return read_psql(lines)
+
+
+def check_question(record, categories):
+    '''
+    the questions row of a record, raises ValueError saying why it can't
+    be inserted
+    '''
+    if not isinstance(record, dict):
+        raise ValueError('not a question object')
+    question = record.get('question')
+    # POST /questions spells it ansewer
+    answer = record.get('answer', record.get('ansewer'))
+    if not isinstance(question, str) or not question.strip():
+        raise ValueError('missing question')
+    if not isinstance(answer, str) or not answer.strip():
+        raise ValueError('missing answer')
+    category = str(record.get('category'))
+    if category not in categories:
+        raise ValueError('unknown category %s' % category)
+    try:
+        difficulty = int(record.get('difficulty'))
+    except (TypeError, ValueError):
+        raise ValueError('difficulty must be a number')
+    return {'question': question, 'answer': answer, 'category': category,
+            'difficulty': difficulty}
+
+
+def insert_batch(rows):
+    try:
+        db.session.execute(Question.__table__.insert(), rows)
+        connection = db.session.connection()
+        counts = Counter((row['category'], row['difficulty']) for row in rows)
+        for (category, difficulty), delta in counts.items():
+            count_questions(connection, category, difficulty, delta)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def ingest_questions(records, categories, batch_size=BATCH_SIZE, echo=None):
+    '''
+    inserts the valid (line number, record) pairs of records, skipping the
+    others, and returns a report of what was inserted and rejected
+    categories is the set of valid category ids as strings; echo, when
+    given, is called with a progress line after each batch
+    '''
+    inserted, rejected, errors = 0, 0, []
+    start = time.perf_counter()
+    batch = []
+
+    def flush():
+        insert_batch(batch)
+        del batch[:]
+        if echo is not None:
+            elapsed = time.perf_counter() - start
+            echo('%s questions imported (%.0f rows/sec)' % (
+                inserted, inserted / elapsed if elapsed else inserted))
+
+    for number, record in records:
+        try:
+            batch.append(check_question(record, categories))
+        except ValueError as error:
+            rejected += 1
+            if len(errors) < MAX_ERRORS:
+                errors.append({'line': number, 'error': str(error)})
+            continue
+        inserted += 1
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'inserted': inserted,
+        'rejected': rejected,
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(inserted / elapsed, 1) if elapsed else None
+    }
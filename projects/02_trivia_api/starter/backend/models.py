@@ -1,16 +1,24 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Column, String, Integer, create_engine, event, \
+    func, select, cast, inspect, case, and_, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import column_property
+from routing import RoutingSQLAlchemy
+from search import setup_search
 import json
+from collections import Counter
 
 database_name = "trivia"
-database_path = "postgres://{}/{}".format('localhost:5432', database_name)
+database_path = os.environ.get(
+    'DATABASE_URL', "postgres://{}/{}".format('localhost:5432', database_name))
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 
 '''
 setup_db(app)
     binds a flask application and a SQLAlchemy service
+    pool settings come from the DB_POOL_* environment variables, see pooling.py,
+    read replicas from DATABASE_REPLICA_URLS, see routing.py
 '''
 
 
@@ -20,6 +28,11 @@ def setup_db(app, database_path=database_path):
     db.app = app
     db.init_app(app)
     db.create_all()
+    with db.engine.begin() as connection:
+        # databases loaded from trivia.psql start without counts
+        if connection.execute(
+                select([QuestionCount.category]).limit(1)).first() is None:
+            rebuild_question_counts(connection)
 
 
 '''
@@ -34,8 +47,9 @@ class Question(db.Model):
     id = Column(Integer, primary_key=True)
     question = Column(String)
     answer = Column(String)
-    category = Column(String)
-    difficulty = Column(Integer)
+    # keep the old values on change for the question counts
+    category = column_property(Column(String), active_history=True)
+    difficulty = column_property(Column(Integer), active_history=True)
 
     def __init__(self, question, answer, category, difficulty):
         self.question = question
@@ -64,6 +78,168 @@ class Question(db.Model):
         }
 
 
+setup_search(Question)
+
+
+'''
+QuestionCount
+    the number of questions of each category and difficulty (0 when it
+    has none), kept up to date by the Question mapper events so listings
+    and the category summary don't count the table
+    writes that bypass the ORM must call rebuild_question_counts()
+'''
+
+
+class QuestionCount(db.Model):
+    __tablename__ = 'question_counts'
+
+    category = Column(String, primary_key=True)
+    difficulty = Column(Integer, primary_key=True)
+    questions = Column(Integer, nullable=False, default=0)
+
+
+def count_questions(connection, category, difficulty, delta):
+    if category is None:
+        return
+    table = QuestionCount.__table__
+    key = {'category': str(category), 'difficulty': difficulty or 0}
+    # one INSERT ... ON CONFLICT DO UPDATE, so concurrent writers of a new
+    # (category, difficulty) don't both try to insert it
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        statement = postgresql.insert(table)
+    elif dialect == 'sqlite':
+        statement = sqlite.insert(table)
+    else:
+        result = connection.execute(
+            table.update()
+            .where(table.c.category == key['category'])
+            .where(table.c.difficulty == key['difficulty'])
+            .values(questions=table.c.questions + delta))
+        if not result.rowcount:
+            connection.execute(table.insert().values(
+                questions=max(delta, 0), **key))
+        return
+    connection.execute(
+        statement.values(questions=max(delta, 0), **key).on_conflict_do_update(
+            index_elements=['category', 'difficulty'],
+            set_={'questions': table.c.questions + delta}))
+
+
+def uncount_questions(connection, counts):
+    '''
+    subtracts the {(category, difficulty): n} counts of deleted questions
+    with one statement, whatever the number of pairs
+    '''
+    table = QuestionCount.__table__
+    deltas = Counter()
+    for (category, difficulty), delta in counts.items():
+        if category is not None:
+            deltas[(str(category), difficulty or 0)] += delta
+    if not deltas:
+        return
+    connection.execute(
+        table.update()
+        .where(tuple_(table.c.category, table.c.difficulty).in_(list(deltas)))
+        .values(questions=table.c.questions - case(
+            [(and_(table.c.category == category,
+                   table.c.difficulty == difficulty), delta)
+             for (category, difficulty), delta in deltas.items()],
+            else_=0)))
+
+
+def rebuild_question_counts(connection):
+    table = QuestionCount.__table__
+    questions = Question.__table__
+    difficulty = func.coalesce(questions.c.difficulty, 0)
+    connection.execute(table.delete())
+    connection.execute(table.insert().from_select(
+        ['category', 'difficulty', 'questions'],
+        select([cast(questions.c.category, String), difficulty, func.count()])
+        .where(questions.c.category.isnot(None))
+        .group_by(questions.c.category, difficulty)))
+
+
+def delete_questions(ids):
+    '''
+    deletes the questions of ids with one statement, adjusting the counts
+    in the same transaction, and returns the (id, category) of the deleted
+    the counts follow the rows the DELETE removed: with RETURNING where the
+    database has it, otherwise the rows read and locked beforehand
+    '''
+    table = Question.__table__
+    columns = (table.c.id, table.c.category, table.c.difficulty)
+    try:
+        connection = db.session.connection()
+        if connection.dialect.full_returning:
+            questions = connection.execute(table.delete().where(
+                table.c.id.in_(ids)).returning(*columns)).fetchall()
+        else:
+            questions = connection.execute(select(columns).where(
+                table.c.id.in_(ids)).with_for_update()).fetchall()
+            if questions:
+                connection.execute(table.delete().where(table.c.id.in_(
+                    [question.id for question in questions])))
+        if questions:
+            uncount_questions(connection, Counter(
+                (question.category, question.difficulty)
+                for question in questions))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return [(question.id, question.category) for question in questions]
+
+
+def question_total(category=None):
+    '''
+    the number of questions of a category, or of all of them
+    '''
+    total = db.session.query(
+        func.coalesce(func.sum(QuestionCount.questions), 0))
+    if category is not None:
+        total = total.filter(QuestionCount.category == str(category))
+    return total.scalar()
+
+
+def question_counts():
+    '''
+    {category: {'total': n, 'difficulties': {difficulty: n}}} for every
+    category with questions, from one query on the counts
+    '''
+    counts = {}
+    for count in QuestionCount.query.filter(QuestionCount.questions > 0):
+        summary = counts.setdefault(
+            count.category, {'total': 0, 'difficulties': {}})
+        summary['total'] += count.questions
+        if count.difficulty:
+            summary['difficulties'][count.difficulty] = count.questions
+    return counts
+
+
+@event.listens_for(Question, 'after_insert')
+def count_inserted_question(mapper, connection, target):
+    count_questions(connection, target.category, target.difficulty, 1)
+
+
+@event.listens_for(Question, 'after_delete')
+def count_deleted_question(mapper, connection, target):
+    count_questions(connection, target.category, target.difficulty, -1)
+
+
+@event.listens_for(Question, 'after_update')
+def count_moved_question(mapper, connection, target):
+    state = inspect(target)
+    names = ('category', 'difficulty')
+    changes = [state.attrs[name].history for name in names]
+    if any(history.deleted for history in changes):
+        category, difficulty = [
+            history.deleted[0] if history.deleted else getattr(target, name)
+            for name, history in zip(names, changes)]
+        count_questions(connection, category, difficulty, -1)
+        count_questions(connection, target.category, target.difficulty, 1)
+
+
 '''
 Category
 
@@ -0,0 +1,174 @@
+import os
+import time
+import threading
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+
+'''
+pooling
+    pool size, overflow, timeout, recycle, pre-ping and the statement
+    timeout come from the app config, defaulting to the environment, so
+    each deployment sizes its pools for its worker count:
+
+        DB_POOL_SIZE=5 DB_MAX_OVERFLOW=10 gunicorn -w 4 ...
+
+    opens at most 4 * (5 + 10) connections
+    checkout waits, timeouts and saturation are recorded per pool, see
+    pool_stats()
+'''
+
+POOL_SETTINGS = (
+    # (config key, type, default)
+    ('DB_POOL_SIZE', int, 5),
+    ('DB_MAX_OVERFLOW', int, 10),
+    ('DB_POOL_TIMEOUT', float, 30),
+    ('DB_POOL_RECYCLE', int, 1800),
+    ('DB_POOL_PRE_PING', bool, True),
+    ('DB_STATEMENT_TIMEOUT_MS', int, 0),
+)
+
+
+def environ_setting(name, type, default, environ=os.environ):
+    value = environ.get(name)
+    if value is None or value == '':
+        return default
+    if type is bool:
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return type(value)
+
+
+'''
+PoolMetrics
+    checkout wait times and occupancy of one pool
+'''
+
+
+class PoolMetrics(object):
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.waited = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.peak_checked_out = 0
+
+    def record(self, wait, checked_out, timed_out=False):
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            if wait >= 0.001:
+                self.waited += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def snapshot(self):
+        with self.lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                'checkouts': self.checkouts,
+                'checkouts_waited': self.waited,
+                'checkout_timeouts': self.timeouts,
+                'checkout_wait_avg_ms': round(
+                    self.wait_total * 1000 / attempts, 3) if attempts else 0.0,
+                'checkout_wait_max_ms': round(self.wait_max * 1000, 3),
+                'peak_checked_out': self.peak_checked_out,
+                'peak_saturation': round(
+                    self.peak_checked_out / self.capacity, 3)
+                if self.capacity else None
+            }
+
+
+'''
+MeteredQueuePool
+    a QueuePool recording how long each checkout waited for a connection
+'''
+
+
+class MeteredQueuePool(QueuePool):
+
+    def __init__(self, creator, pool_size=5, max_overflow=10, **kw):
+        super(MeteredQueuePool, self).__init__(
+            creator, pool_size=pool_size, max_overflow=max_overflow, **kw)
+        self.metrics = PoolMetrics(
+            pool_size + max_overflow if max_overflow >= 0 else None)
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super(MeteredQueuePool, self)._do_get()
+        except exc.TimeoutError:
+            self.metrics.record(time.perf_counter() - start,
+                                self.checkedout(), timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - start, self.checkedout())
+        return connection
+
+
+'''
+PooledSQLAlchemy
+    the SQLAlchemy extension creating engines with the DB_POOL_* settings
+    SQLite keeps the pools Flask-SQLAlchemy picks for it, every other
+    database gets a MeteredQueuePool
+'''
+
+
+class PooledSQLAlchemy(SQLAlchemy):
+
+    def init_app(self, app):
+        for name, type, default in POOL_SETTINGS:
+            app.config.setdefault(name, environ_setting(name, type, default))
+        super(PooledSQLAlchemy, self).init_app(app)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        rv = super(PooledSQLAlchemy, self).apply_driver_hacks(
+            app, sa_url, options)
+        if rv is not None:
+            sa_url, options = rv
+        config = app.config
+        backend = sa_url.get_backend_name()
+
+        if backend != 'sqlite':
+            options.setdefault('poolclass', MeteredQueuePool)
+            options.setdefault('pool_size', config['DB_POOL_SIZE'])
+            options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+            options.setdefault('pool_timeout', config['DB_POOL_TIMEOUT'])
+            options.setdefault('pool_recycle', config['DB_POOL_RECYCLE'])
+            options.setdefault('pool_pre_ping', config['DB_POOL_PRE_PING'])
+
+        timeout = config['DB_STATEMENT_TIMEOUT_MS']
+        if timeout and backend.startswith('postgres'):
+            connect_args = options.setdefault('connect_args', {})
+            connect_args['options'] = ('%s -c statement_timeout=%d' % (
+                connect_args.get('options', ''), timeout)).strip()
+        return rv
+
+
+def pool_stats(engine):
+    '''
+    the current occupancy and checkout metrics of an engine's pool
+    '''
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__, 'status': pool.status()}
+    if isinstance(pool, QueuePool):
+        checked_out = pool.checkedout()
+        stats.update({
+            'size': pool.size(),
+            'checked_out': checked_out,
+            'overflow': max(pool.overflow(), 0)
+        })
+    metrics = getattr(pool, 'metrics', None)
+    if metrics is not None:
+        stats['capacity'] = metrics.capacity
+        stats['saturation'] = round(
+            stats['checked_out'] / metrics.capacity, 3) \
+            if metrics.capacity else None
+        stats.update(metrics.snapshot())
+    return stats
@@ -0,0 +1,103 @@
+from sqlalchemy import DDL, event, func, case, column, or_, \
+    literal_column, table as table_clause
+
+
+'''
+search
+    questions and answers searched through an index instead of a scan
+    PostgreSQL: pg_trgm GIN indexes serve the ILIKE '%term%' filter
+    SQLite: an FTS5 trigram table kept in sync by triggers
+    both return a ranked page and the total match count in one query
+'''
+
+SEARCH_COLUMNS = ('question', 'answer')
+# bm25 weights of the columns: a match in the question ranks first
+QUESTION_WEIGHTS = (10.0, 1.0)
+
+
+def setup_search(model):
+    '''
+    registers the search index DDL of a model's question and answer
+    for existing PostgreSQL databases run the same statements by hand, see
+    the README
+    '''
+    table = model.__table__
+    name = table.name
+    names = {
+        'name': name,
+        'columns': ', '.join(SEARCH_COLUMNS),
+        'new': ', '.join('new.' + c for c in SEARCH_COLUMNS),
+        'old': ', '.join('old.' + c for c in SEARCH_COLUMNS)
+    }
+
+    statements = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"] + [
+        "CREATE INDEX IF NOT EXISTS ix_%(name)s_%(column)s_trgm "
+        "ON %(name)s USING gin (%(column)s gin_trgm_ops)" % dict(
+            name=name, column=c) for c in SEARCH_COLUMNS]
+    for statement in statements:
+        event.listen(table, 'after_create',
+                     DDL(statement).execute_if(dialect='postgresql'))
+
+    for statement in (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS %(name)s_search USING "
+        "fts5(%(columns)s, content='%(name)s', content_rowid='id', "
+        "tokenize='trigram')",
+        "CREATE TRIGGER %(name)s_search_insert AFTER INSERT ON %(name)s BEGIN "
+        "INSERT INTO %(name)s_search(rowid, %(columns)s) "
+        "VALUES (new.id, %(new)s); END",
+        "CREATE TRIGGER %(name)s_search_delete AFTER DELETE ON %(name)s BEGIN "
+        "INSERT INTO %(name)s_search(%(name)s_search, rowid, %(columns)s) "
+        "VALUES ('delete', old.id, %(old)s); END",
+        "CREATE TRIGGER %(name)s_search_update AFTER UPDATE ON %(name)s BEGIN "
+        "INSERT INTO %(name)s_search(%(name)s_search, rowid, %(columns)s) "
+        "VALUES ('delete', old.id, %(old)s); "
+        "INSERT INTO %(name)s_search(rowid, %(columns)s) "
+        "VALUES (new.id, %(new)s); END"
+    ):
+        event.listen(table, 'after_create',
+                     DDL(statement % names).execute_if(dialect='sqlite'))
+
+    event.listen(table, 'before_drop', DDL(
+        "DROP TABLE IF EXISTS %s_search" % name).execute_if(dialect='sqlite'))
+
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_page(session, model, term, page, per_page):
+    '''
+    the page of questions matching term, best matches first, and the total
+    number of matches: (rows, total)
+    rows are model instances; an empty page past the last one has a total
+    of 0, as there is no row to carry it
+    '''
+    table = model.__table__
+    term = term.strip()
+    pattern = '%' + escape_like(term) + '%'
+    total = func.count().over().label('total')
+    query = session.query(model, total)
+    dialect = session.connection().dialect.name
+
+    # the trigram index only serves terms of three characters or more
+    if dialect == 'sqlite' and len(term) >= 3:
+        search = table_clause('%s_search' % table.name,
+                              column('rowid'), column('rank'))
+        query = query \
+            .join(search, search.c.rowid == table.c.id) \
+            .filter(literal_column(search.name).op('MATCH')(
+                '"%s"' % term.replace('"', '""'))) \
+            .filter(search.c.rank.op('MATCH')(
+                'bm25(%s, %s)' % QUESTION_WEIGHTS)) \
+            .order_by(search.c.rank, table.c.id)
+    else:
+        query = query.filter(or_(*[
+            table.c[c].ilike(pattern, escape='\\') for c in SEARCH_COLUMNS]))
+        ranks = [case([(table.c.question.ilike(pattern, escape='\\'), 0)],
+                      else_=1)]
+        if dialect == 'postgresql':
+            ranks.append(func.similarity(table.c.question, term).desc())
+        query = query.order_by(*ranks + [table.c.id])
+
+    rows = query.limit(per_page).offset((page - 1) * per_page).all()
+    return [row[0] for row in rows], rows[0].total if rows else 0
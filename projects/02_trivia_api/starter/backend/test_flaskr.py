@@ -1,19 +1,25 @@
 import os
 import unittest
 import json
+import time
+import tempfile
 from flask_sqlalchemy import SQLAlchemy
 
-from flaskr import create_app
-from models import setup_db, Question, Category
+from flaskr import create_app, category_cache, question_index, \
+    with_categories
+from models import setup_db, db, Question, Category, rebuild_question_counts
 import re
 
+# a request issuing more queries than its endpoint's budget fails the test
+STRICT_BUDGETS = {'TESTING': True, 'SQL_QUERY_BUDGET_STRICT': True}
+
 
 class TriviaTestCase(unittest.TestCase):
     """This class represents the trivia test case"""
 
     def setUp(self):
         """Define test variables and initialize app."""
-        self.app = create_app()
+        self.app = create_app(STRICT_BUDGETS)
         self.client = self.app.test_client
         self.database_name = "trivia_test"
         self.database_path = "postgres://{}/{}".format(
@@ -60,6 +66,174 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['success'])
         self.assertTrue(len(data['questions']))
 
+    def test_server_timing_header(self):
+        """Test responses report SQL query count and time"""
+        res = self.client().get('/categories')
+        timing = res.headers.getlist('Server-Timing')
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(timing[0].startswith('db;dur='))
+        self.assertIn('desc="1 queries"', timing[0])
+
+    def test_categories_are_cached(self):
+        """Test categories come from memory until a category changes"""
+        self.client().get('/categories')
+        res = self.client().get('/categories')
+        timing = res.headers.getlist('Server-Timing')
+        self.assertIn('desc="0 queries"', timing[0])
+
+        category = Category('Music')
+        db.session.add(category)
+        db.session.commit()
+        res = self.client().get('/categories')
+        data = json.loads(res.data)
+        self.assertEqual(data['categories'][str(category.id)], 'Music')
+        db.session.delete(category)
+        db.session.commit()
+        res = self.client().get('/categories')
+        self.assertNotIn(str(category.id), json.loads(res.data)['categories'])
+
+    def test_with_categories(self):
+        """Test the category map is spliced into any payload"""
+        with self.app.test_request_context():
+            for payload in ({}, {'success': True, 'total': [1, 2]}):
+                data = json.loads(with_categories(payload).get_data())
+                self.assertEqual(data, dict(
+                    payload, categories=json.loads(category_cache.fragment())))
+
+    def test_cache_ttls_from_config(self):
+        """Test create_app takes the cache TTLs from test_config"""
+        create_app({'CATEGORY_CACHE_TTL': None, 'QUESTION_INDEX_TTL': 5})
+        self.assertIsNone(category_cache.ttl)
+        self.assertEqual(question_index.ttl, 5)
+        create_app()
+        self.assertEqual(category_cache.ttl, 300)
+        self.assertEqual(question_index.ttl, 3600)
+
+    def test_categories_with_counts(self):
+        """Test categories report their question counts by difficulty"""
+        res = self.client().get('/categories?counts=true')
+        counts = json.loads(res.data)['counts']
+        self.assertEqual(sum(count['total'] for count in counts.values()),
+                         Question.query.count())
+
+        category_id = str(Category.query.first().id)
+        question = Question('Histogram?', 'Yes', category_id, 5)
+        question.insert()
+        question.difficulty = 4
+        question.update()
+        res = self.client().get('/categories?counts=true')
+        count = json.loads(res.data)['counts'][category_id]
+        self.assertEqual(count['total'], counts[category_id]['total'] + 1)
+        self.assertEqual(count['difficulties'].get('5'),
+                         counts[category_id]['difficulties'].get('5'))
+        self.assertEqual(count['difficulties']['4'],
+                         counts[category_id]['difficulties'].get('4', 0) + 1)
+        question.delete()
+        self.assertNotIn('counts', json.loads(
+            self.client().get('/categories').data))
+
+    def test_lean_writes_and_batch_delete(self):
+        """Test minimal write responses and deleting many questions"""
+        category_id = Category.query.first().id
+        created = []
+        for params, headers in (('?lean=true', {}),
+                                ('', {'Prefer': 'return=minimal'})):
+            res = self.client().post('/questions' + params, headers=headers,
+                                     json={'question': 'Lean?',
+                                           'ansewer': 'Yes',
+                                           'category': category_id,
+                                           'difficulty': 1})
+            data = json.loads(res.data)
+            self.assertEqual(res.status_code, 201)
+            self.assertEqual(set(data), {'success', 'created'})
+            self.assertEqual(res.headers['Preference-Applied'],
+                             'return=minimal')
+            created.append(data['created'])
+
+        total = Question.query.count()
+        res = self.client().delete('/questions?lean=true',
+                                   json={'ids': created + [0]})
+        self.assertEqual(json.loads(res.data),
+                         {'success': True, 'deleted': sorted(created)})
+        self.assertEqual(Question.query.count(), total - 2)
+        res = self.client().delete('/questions', json={'ids': created})
+        self.assertEqual(res.status_code, 404)
+        for body in ({'ids': 'all'}, [1, 2]):
+            res = self.client().delete('/questions', json=body)
+            self.assertEqual(res.status_code, 422)
+
+    def test_batch_delete_counts(self):
+        """Test a batch delete adjusts several counts in one statement"""
+        category_id = str(Category.query.first().id)
+        res = self.client().get('/categories?counts=true')
+        counts = json.loads(res.data)['counts'][category_id]
+        ids = []
+        for difficulty in (1, 2, 3):
+            question = Question('Batch?', 'Yes', category_id, difficulty)
+            question.insert()
+            ids.append(question.id)
+
+        res = self.client().delete('/questions', json={'ids': ids})
+        self.assertEqual(res.status_code, 200)
+        # SELECT and DELETE (one DELETE ... RETURNING on PostgreSQL), one
+        # UPDATE of the counts and the total
+        queries = re.search(r'"(\d+) queries"', res.headers['Server-Timing'])
+        self.assertLessEqual(int(queries.group(1)), 4)
+        res = self.client().get('/categories?counts=true')
+        self.assertEqual(json.loads(res.data)['counts'][category_id], counts)
+
+    def test_bulk_questions(self):
+        """Test bulk loading questions as JSON and from trivia.psql"""
+        last_id = Question.query.order_by(Question.id.desc()).first().id
+        total = Question.query.count()
+        category_id = Category.query.first().id
+        res = self.client().post('/questions/bulk', json={'questions': [
+            {'question': 'Bulk?', 'answer': 'Yes',
+             'category': category_id, 'difficulty': 2},
+            {'question': 'Lost?', 'answer': 'Yes',
+             'category': 0, 'difficulty': 2}
+        ]})
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(data['inserted'], 1)
+        self.assertEqual(data['errors'], [
+            {'line': 2, 'error': 'unknown category 0'}])
+
+        path = os.path.join(os.path.dirname(__file__), 'trivia.psql')
+        with open(path, 'rb') as dump:
+            res = self.client().post('/questions/bulk', data=dump.read(),
+                                     content_type='text/plain')
+        self.assertEqual(json.loads(res.data)['inserted'], 19)
+
+        for body in ([{'question': 'Bulk?'}], 'questions', {'questions': 1}):
+            res = self.client().post('/questions/bulk', json=body)
+            self.assertEqual(res.status_code, 422)
+
+        lines = os.path.join(tempfile.mkdtemp(), 'pack.jsonl')
+        with open(lines, 'w') as pack:
+            for i in range(3):
+                pack.write(json.dumps({
+                    'question': 'Pack %s?' % i, 'answer': 'Yes',
+                    'category': category_id, 'difficulty': 1}) + '\n')
+        result = self.app.test_cli_runner().invoke(
+            args=['import-questions', lines, '--batch-size', '2'])
+        self.assertIn('Imported 3 questions, rejected 0', result.output)
+
+        res = self.client().get('/questions')
+        self.assertEqual(json.loads(res.data)['total_questions'], total + 23)
+        for question in Question.query.filter(Question.id > last_id):
+            question.delete()
+
+    def test_pool_metrics(self):
+        """Test the pool reports its settings and checkout metrics"""
+        res = self.client().get('/metrics/pool')
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['pool'], 'MeteredQueuePool')
+        self.assertEqual(data['size'], self.app.config['DB_POOL_SIZE'])
+        self.assertGreaterEqual(data['checkouts'], 1)
+        self.assertIn('saturation', data)
+
     def test_404_get_questions_by_category(self):
         """Test if the category not exist"""
         res = self.client().get('/categories/0/questions')
@@ -113,6 +287,55 @@ class TriviaTestCase(unittest.TestCase):
         for question in data['questions']:
             self.assertTrue(re.search(randomTerm, question['question'], re.I))
 
+    def test_questions_after_id(self):
+        """Test keyset pages match numbered pages and counts stay exact"""
+        first = json.loads(self.client().get('/questions').data)
+        second = json.loads(self.client().get(
+            '/questions?after=%s' % first['next_after']).data)
+        self.assertEqual(second['questions'], json.loads(
+            self.client().get('/questions?page=2').data)['questions'])
+        self.assertEqual(first['total_questions'], Question.query.count())
+
+        category_id = Category.query.first().id
+        url = '/categories/%s/questions' % category_id
+        total = json.loads(self.client().get(url).data)['total_questions']
+        question = Question('Counted?', 'Yes', category_id, 1)
+        question.insert()
+        data = json.loads(self.client().get(
+            '%s?after=%s' % (url, question.id - 1)).data)
+        self.assertEqual(data['questions'], [question.format()])
+        self.assertEqual(data['total_questions'], total + 1)
+        question.delete()
+        data = json.loads(self.client().get(url).data)
+        self.assertEqual(data['total_questions'], total)
+
+    def test_search_ranks_questions_before_answers(self):
+        """Test search matches answers too, question matches first"""
+        category_id = Category.query.first().id
+        in_answer = Question('Which planet is fourth from the sun?',
+                             'Mars, the crimson planet', category_id, 2)
+        in_answer.insert()
+        in_question = Question('Which crimson planet has two moons?',
+                               'Mars', category_id, 1)
+        in_question.insert()
+
+        def search(term, page=1):
+            return self.client().post('/questions?page=%s' % page,
+                                      data=json.dumps(dict(searchTerm=term)),
+                                      content_type='application/json')
+
+        data = json.loads(search('CRIMSON').data)
+        self.assertEqual(data['total_questions'], 2)
+        self.assertEqual([question['id'] for question in data['questions']],
+                         [in_question.id, in_answer.id])
+        self.assertEqual(search('crimson', page=2).status_code, 404)
+
+        in_answer.delete()
+        in_question.delete()
+        data = json.loads(search('crimson').data)
+        self.assertEqual(data['total_questions'], 0)
+        self.assertEqual(data['questions'], [])
+
     def test_delete_question(self):
         """Test delete a question"""
         existID = Question.query.first().id
@@ -152,6 +375,118 @@ class TriviaTestCase(unittest.TestCase):
             self.assertTrue(data['question'])
             total_request = total_request + 1
 
+    def test_quiz_skips_previous_questions(self):
+        """Test quizzes never repeat a question and end when none is left"""
+        category_id = Category.query.first().id
+        ids = [question.id for question in Question.query.filter(
+            Question.category == category_id)]
+
+        def play(previous):
+            res = self.client().post('/quizzes', data=json.dumps(dict(
+                previous_questions=previous,
+                quiz_category={'id': category_id}
+            )),
+                content_type='application/json')
+            self.assertEqual(res.status_code, 200)
+            return json.loads(res.data)['question']
+
+        self.assertEqual(play(ids[1:])['id'], ids[0])
+        self.assertIsNone(play(ids))
+
+        question = Question('Quiz?', 'Yes', category_id, 1)
+        question.insert()
+        self.assertEqual(play(ids)['id'], question.id)
+        question.delete()
+        self.assertIsNone(play(ids))
+
+    def test_question_index_follows_changes(self):
+        """Test the quiz index follows edits and refreshes off the request"""
+        first, second = [category.id for category in
+                         Category.query.order_by(Category.id).limit(2)]
+        question = Question('Moved?', 'Yes', first, 1)
+        question.insert()
+        with self.app.app_context():
+            pools = question_index._load()
+            self.assertIn(question.id, pools[str(first)])
+
+            question.difficulty = 2
+            question.update()
+            self.assertEqual(list(pools[str(first)]).count(question.id), 1)
+            question.category = str(second)
+            question.update()
+            self.assertNotIn(question.id, pools[str(first)])
+            self.assertIn(question.id, pools[str(second)])
+
+            # served as it is while a thread rebuilds it
+            question_index.invalidate()
+            self.assertIs(question_index._load(), pools)
+            while question_index.refreshing:
+                time.sleep(0.01)
+            self.assertIsNot(question_index._load(), pools)
+            self.assertIn(question.id, question_index._load()[str(second)])
+        question.delete()
+
+
+class ReplicaRoutingTestCase(unittest.TestCase):
+    """Two SQLite files stand in for the primary and a read replica"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.replica = 'sqlite:///' + os.path.join(directory, 'replica.db')
+        self.app = create_app(STRICT_BUDGETS)
+        self.app.config['SQLALCHEMY_REPLICA_URIS'] = [self.replica]
+        setup_db(self.app, 'sqlite:///' + os.path.join(directory, 'primary.db'))
+        self.client = self.app.test_client
+
+        with self.app.app_context():
+            db.session.add(Category('Science'))
+            db.session.commit()
+            replica = db.get_replica(self.app, self.replica)
+            db.Model.metadata.create_all(replica)
+            with replica.begin() as connection:
+                connection.execute(Category.__table__.insert(), {'type': 'Science'})
+                connection.execute(Question.__table__.insert(), [
+                    {'question': 'Replica %s?' % i, 'answer': 'yes',
+                     'category': '1', 'difficulty': 1} for i in range(2)])
+                rebuild_question_counts(connection)
+
+    def tearDown(self):
+        self.app.config['SQLALCHEMY_REPLICA_URIS'] = []
+
+    def test_reads_go_to_replica_until_client_writes(self):
+        def total(client):
+            res = client.get('/questions')
+            return json.loads(res.data)['total_questions']
+
+        client = self.client()
+        self.assertEqual(total(client), 2)
+
+        res = client.post('/questions', json={
+            'question': 'Which file?', 'ansewer': 'primary.db',
+            'category': 1, 'difficulty': 1})
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(json.loads(res.data)['total_questions'], 1)
+        self.assertIn('db_write_at=', res.headers['Set-Cookie'])
+
+        self.assertEqual(total(client), 1)
+        self.assertEqual(total(self.client()), 2)
+
+    def test_only_searches_post_to_replica(self):
+        # the category exists on the replica only
+        replica = db.get_replica(self.app, self.replica)
+        with replica.begin() as connection:
+            connection.execute(Category.__table__.insert(), {'type': 'Art'})
+
+        client = self.client()
+        res = client.post('/questions', json={'searchTerm': 'Replica'})
+        data = json.loads(res.data)
+        self.assertEqual(data['total_questions'], 2)
+        self.assertEqual(data['categories'], {'1': 'Science'})
+        res = client.post('/questions', json={
+            'question': 'Which file?', 'ansewer': 'replica.db',
+            'category': 2, 'difficulty': 1})
+        self.assertEqual(res.status_code, 422)
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":
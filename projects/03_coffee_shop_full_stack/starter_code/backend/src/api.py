@@ -6,10 +6,15 @@ from flask_cors import CORS
 
 from .database.models import db_drop_and_create_all, setup_db, Drink
 from .auth.auth import AuthError, requires_auth
+from .instrumentation import QueryInstrumentation
 
 app = Flask(__name__)
 setup_db(app)
 CORS(app, resources={r"*": {"origins": "*"}})
+QueryInstrumentation(app, budgets={
+    'get_drinks': 1,
+    'get_drinks_detail': 1
+})
 
 db_drop_and_create_all()
 
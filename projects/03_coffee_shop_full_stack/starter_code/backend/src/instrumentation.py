@@ -0,0 +1,158 @@
+import json
+import time
+import heapq
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+'''
+instrumentation
+    counts the statements and database time of every request through
+    SQLAlchemy engine events and reports them in a Server-Timing header and
+    a JSON log line
+    slow statements are logged; the query budgets of the drinks endpoints
+    are set in api.py and raise while testing, log otherwise
+'''
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestQueries(object):
+
+    def __init__(self, keep):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = []
+        self.keep = keep
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        entry = (duration, self.count, statement)
+        if len(self.slowest) < self.keep:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heappushpop(self.slowest, entry)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    started = conn.info['query_start_time'].pop()
+    if not has_request_context():
+        return
+    queries = g.get('sql_queries')
+    if queries is not None:
+        duration = time.perf_counter() - started
+        queries.record(statement, duration)
+        extension = g.get('sql_instrumentation')
+        if duration * 1000 >= extension.slow_query_ms:
+            extension.logger.warning(json.dumps({
+                'event': 'slow_query',
+                'path': request.path,
+                'duration_ms': round(duration * 1000, 3),
+                'statement': statement
+            }))
+
+
+def _handle_error(context):
+    if context.connection is not None:
+        started = context.connection.info.get('query_start_time')
+        if started:
+            started.pop()
+
+
+'''
+QueryInstrumentation
+    the flask extension, configured with
+        SQL_SLOW_QUERY_MS        statements slower than this are logged (100)
+        SQL_SLOWEST_QUERIES      slowest statements kept per request (3)
+        SQL_QUERY_BUDGETS        {endpoint: max queries}, over the budgets
+                                 given to the constructor
+        SQL_QUERY_BUDGET_STRICT  raise QueryBudgetExceeded instead of
+                                 logging (defaults to app.testing)
+'''
+
+
+class QueryInstrumentation(object):
+
+    _listening = False
+
+    def __init__(self, app=None, budgets=None):
+        self.budgets = dict(budgets or {})
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SQL_SLOW_QUERY_MS', 100)
+        app.config.setdefault('SQL_SLOWEST_QUERIES', 3)
+        app.config.setdefault('SQL_QUERY_BUDGETS', {})
+        app.extensions['sql_instrumentation'] = self
+        self.app = app
+        self.logger = app.logger
+
+        if not QueryInstrumentation._listening:
+            event.listen(Engine, 'before_cursor_execute',
+                         _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute',
+                         _after_cursor_execute)
+            event.listen(Engine, 'handle_error', _handle_error)
+            QueryInstrumentation._listening = True
+
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    @property
+    def slow_query_ms(self):
+        return self.app.config['SQL_SLOW_QUERY_MS']
+
+    def budget(self, endpoint):
+        budgets = dict(self.budgets, **self.app.config['SQL_QUERY_BUDGETS'])
+        return budgets.get(endpoint)
+
+    def _start(self):
+        g.sql_instrumentation = self
+        g.sql_queries = RequestQueries(self.app.config['SQL_SLOWEST_QUERIES'])
+        g.sql_request_start = time.perf_counter()
+
+    def _finish(self, response):
+        queries = g.pop('sql_queries', None)
+        if queries is None:
+            return response
+        total_ms = (time.perf_counter() - g.sql_request_start) * 1000
+        db_ms = queries.duration * 1000
+        response.headers.add('Server-Timing', 'db;dur=%.3f;desc="%s queries"'
+                             % (db_ms, queries.count))
+        response.headers.add('Server-Timing', 'app;dur=%.3f' % total_ms)
+
+        self.logger.info(json.dumps({
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(total_ms, 3),
+            'db_ms': round(db_ms, 3),
+            'queries': queries.count,
+            'slowest': [{'duration_ms': round(duration * 1000, 3),
+                         'statement': statement}
+                        for duration, _, statement in
+                        sorted(queries.slowest, reverse=True)]
+        }))
+
+        budget = self.budget(request.endpoint)
+        if budget is not None and queries.count > budget:
+            message = '%s issued %s queries, budget is %s' % (
+                request.endpoint, queries.count, budget)
+            if self.app.config.get('SQL_QUERY_BUDGET_STRICT',
+                                   self.app.testing):
+                raise QueryBudgetExceeded(message)
+            self.logger.warning(message)
+        return response